@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+# How long a token -> user id mapping is kept in the cache (seconds)
+TOKEN_CACHE_TIMEOUT = 60
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token -> user id mapping so repeated
+    API calls skip the token table lookup.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = f'auth_token:{key}'
+        user_id = cache.get(cache_key)
+
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, user.pk, TOKEN_CACHE_TIMEOUT)
+            return (user, token)
+
+        try:
+            user = get_user_model().objects.get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            cache.delete(cache_key)
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # request.auth is a Token on both paths; this one is built from the
+        # cached mapping rather than read back, so only its created time is unset
+        return (user, self.get_model()(key=key, user=user))
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over `created_at`, which avoids the COUNT(*) query
+    page number pagination runs on every page.
+    """
+    ordering = '-created_at'
@@ -9,14 +9,22 @@ router = DefaultRouter()
 # Register your API views here
 # router.register(r'example', views.ExampleViewSet)
 
-# Create a schema view for the API
-docs_view = get_schema_view(
-    title="Speech to Text API",
-    description="API documentation for the Speech to Text service",
-    version="1.0.0",
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+# Schema view for the API, built on first request instead of at import time
+_schema_view = None
+
+
+def docs_view(request, *args, **kwargs):
+    global _schema_view
+    if _schema_view is None:
+        _schema_view = get_schema_view(
+            title="Speech to Text API",
+            description="API documentation for the Speech to Text service",
+            version="1.0.0",
+            public=True,
+            permission_classes=(permissions.AllowAny,),
+        )
+    return _schema_view(request, *args, **kwargs)
+
 
 urlpatterns = [
     # API root
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# Load the audio views and tasks (torch, diarization model) at start-up
+# rather than during the first request
+from audio import views, tasks  # noqa: E402,F401
@@ -1,7 +1,32 @@
 import os
 import sys
+import logging
+from importlib import metadata
 from pathlib import Path
 
+
+def _supports_expandable_segments():
+    """expandable_segments was added to the CUDA allocator in PyTorch 2.1"""
+    try:
+        major, minor = (int(part) for part in metadata.version('torch').split('.')[:2])
+    except (metadata.PackageNotFoundError, ValueError):
+        return False
+    return (major, minor) >= (2, 1)
+
+
+# PyTorch reads PYTORCH_CUDA_ALLOC_CONF only once, when the CUDA caching
+# allocator initializes; anything set after the first CUDA call is ignored.
+# This module is imported from app/__init__.py before any torch usage in
+# Django, management commands and Celery workers, so configure it here.
+# Expandable segments grow one mapping instead of carving fixed-size
+# blocks, so a split size cap only adds fragmentation on top of them; it
+# is kept for older PyTorch versions that can't expand segments.
+if _supports_expandable_segments():
+    _alloc_conf = 'expandable_segments:True,garbage_collection_threshold:0.8'
+else:
+    _alloc_conf = 'max_split_size_mb:128,garbage_collection_threshold:0.8'
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', _alloc_conf)
+
 # Add the project root directory to the Python path
 project_root = str(Path(__file__).parent.parent.parent)
 if project_root not in sys.path:
@@ -23,6 +48,8 @@ try:
 except ImportError:
     pass
 
+logger = logging.getLogger(__name__)
+
 # Create Celery app
 app = Celery('app.app')
 
@@ -35,30 +62,27 @@ app.conf.broker_transport_options = {
     'interval_start': 0,
     'interval_step': 0.2,
     'interval_max': 0.5,
+    'visibility_timeout': 43200,  # 12 hours
+    'fanout_prefix': True,
+    'fanout_patterns': True,
+    'socket_connect_timeout': 5,
+    'socket_keepalive': True,
+    'socket_timeout': 5,
+    'health_check_interval': 30,
 }
 
-# Configure result backend settings
-app.conf.result_backend = 'django-db'
-app.conf.result_extended = True
+# Reuse broker connections across tasks
+app.conf.broker_pool_limit = 10
+app.conf.redis_max_connections = 20
 
 # Task configuration
 app.conf.task_acks_late = True
+app.conf.task_acks_on_failure_or_timeout = True
 app.conf.task_reject_on_worker_lost = True
 app.conf.worker_prefetch_multiplier = 1
-app.conf.worker_max_tasks_per_child = 100
 app.conf.task_default_priority = 5
 app.conf.task_queue_max_priority = 10
 
-# Timeouts
-app.conf.broker_transport_options = {
-    'visibility_timeout': 43200,  # 12 hours
-    'fanout_prefix': True,
-    'fanout_patterns': True,
-    'socket_connect_timeout': 5,
-    'socket_keepalive': True,
-    'socket_timeout': 5,
-}
-
 # Beat configuration if using scheduled tasks
 app.conf.beat_scheduler = 'django_celery_beat.schedulers:DatabaseScheduler'
 
@@ -66,7 +90,9 @@ app.conf.beat_scheduler = 'django_celery_beat.schedulers:DatabaseScheduler'
 # the configuration object to child processes.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Task results are stored on the models, not in a Celery result backend
 app.conf.result_backend = None
+app.conf.task_ignore_result = True
 
 # Optimization: Disable task events if not needed
 app.conf.worker_send_task_events = False
@@ -76,67 +102,159 @@ app.conf.task_send_sent_event = False
 app.conf.task_time_limit = 3600  # 1 hour
 app.conf.task_soft_time_limit = 3600  # 1 hour
 
-# Optimize memory usage
-app.conf.worker_max_tasks_per_child = 10
-app.conf.worker_max_memory_per_child = 300000  # 300MB
+# Optimize memory usage. Each child keeps its Whisper models loaded between
+# tasks, so the memory limit has to leave room for them. Recycling a child
+# reloads and warms up its models, so the task limit is only a backstop for
+# slow leaks; the memory limit catches the fast ones.
+app.conf.worker_max_tasks_per_child = int(os.getenv('WORKER_MAX_TASKS_PER_CHILD', 200))
+app.conf.worker_max_memory_per_child = 3000000  # 3GB
 
-# Disable prefetching to prevent memory issues with large models
+# Disable prefetching to prevent memory issues with large models.
+# Workers should also be started with `-O fair` so a long transcription
+# doesn't hold other reserved tasks behind it in the same child process.
 app.conf.worker_prefetch_multiplier = 1
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks(['audio'])
 
-# This will make sure the tasks are imported when Django starts
-# but only when the Celery worker starts, not during Django's initialization
-if 'worker' in sys.argv[0]:
-    from django.apps import apps
-    apps.check_apps_ready()
-    
-    # Explicitly import tasks to ensure they're registered
+
+@signals.worker_init.connect
+def import_worker_tasks(**kwargs):
+    """Make sure the audio tasks are registered once the worker starts."""
     from audio import tasks  # noqa
+
+
+# Thresholds for releasing cached CUDA memory between tasks. The caching
+# allocator is only flushed when it has reserved most of the device and a
+# large share of that reservation is sitting unused.
+CUDA_RESERVED_THRESHOLD = 0.8
+CUDA_UNUSED_THRESHOLD = 0.25
+
+# Otherwise the cache is only flushed every N tasks
+CUDA_EMPTY_CACHE_INTERVAL = int(os.getenv('CUDA_EMPTY_CACHE_INTERVAL', 64))
+
+# Run a full garbage collection only once the child's RSS passes this share
+# of worker_max_memory_per_child
+GC_RSS_HIGH_WATERMARK = 0.8
+
+# Tasks run in this worker process since the CUDA cache was last flushed
+_tasks_since_empty_cache = 0
+
+# Queue of the tasks that load Whisper models (see CELERY_TASK_ROUTES)
+TRANSCRIPTION_QUEUE = 'gpu'
+
+# Whether this worker consumes TRANSCRIPTION_QUEUE; set in worker_init and
+# inherited by prefork children
+_transcribes = False
+
+# Set once setup_worker_process has run in this process
+_process_set_up = False
+
+
+@signals.worker_init.connect
+def setup_single_process_worker(sender=None, **kwargs):
+    """Initialize threads pool workers, which never fork children."""
+    global _transcribes
     
-    # Print registered tasks for debugging
-    print("Registered tasks:", list(app.tasks.keys()))
+    # Only workers that transcribe load models and reserve GPU buffers;
+    # the ffmpeg and default workers never touch CUDA
+    try:
+        _transcribes = TRANSCRIPTION_QUEUE in sender.app.amqp.queues.consume_from
+    except AttributeError:
+        _transcribes = False
+    
+    # Prefork workers are set up per child in worker_process_init instead;
+    # touching CUDA here would break their forked children. The solo pool
+    # sends worker_process_init itself, so only the threads pool needs this.
+    # pool_cls is resolved to a class by now; its module is celery.concurrency.thread.
+    from celery.concurrency.thread import TaskPool as ThreadTaskPool
+    pool_cls = getattr(sender, 'pool_cls', None)
+    if isinstance(pool_cls, type) and issubclass(pool_cls, ThreadTaskPool):
+        setup_worker_process()
 
 
 @signals.worker_process_init.connect
 def setup_worker_process(**kwargs):
     """Initialize worker process."""
-    # Set up process-specific settings
-    import os
-    import torch
+    global _process_set_up
     
-    # Reduce PyTorch memory fragmentation
-    os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128'
+    # PYTORCH_CUDA_ALLOC_CONF is set when this module is imported
+    if not _transcribes or _process_set_up:
+        return
+    _process_set_up = True
     
-    # Enable memory-efficient attention if available
-    try:
-        from xformers.ops import memory_efficient_attention
-        torch.backends.cuda.enable_flash_sdp(True)
-        torch.backends.cuda.enable_mem_efficient_sdp(True)
-    except ImportError:
-        pass
+    # Reserve the input buffers once so tasks don't allocate per file. Only
+    # openai-whisper reads them; faster-whisper takes NumPy arrays directly.
+    from audio.tasks import USES_OPENAI_WHISPER
+    if USES_OPENAI_WHISPER:
+        from audio.buffers import allocate_buffers
+        allocate_buffers()
+    
+    # Enable memory-efficient attention if available. CTranslate2 has its
+    # own attention kernels, so this only matters for openai-whisper.
+    if USES_OPENAI_WHISPER:
+        from audio.attention import configure_attention
+        configure_attention()
+    
+    # Load and warm up the default model up front so the first task
+    # doesn't pay for loading or compiling it
+    from audio.tasks import WHISPER_AVAILABLE, warm_up_whisper_model
+    if WHISPER_AVAILABLE:
+        try:
+            warm_up_whisper_model('base')
+        except Exception as e:
+            logger.warning(f"Could not preload Whisper model: {e}")
+
+
+@signals.worker_process_shutdown.connect
+def teardown_worker_process(**kwargs):
+    """Release cached models before the worker process exits."""
+    from audio.tasks import clear_model_cache
+    clear_model_cache()
 
 
-@signals.task_prerun.connect
-def before_task_run(task_id, task, *args, **kwargs):
-    """Run before each task."""
-    # Clear CUDA cache before each task to prevent OOM
+def _collect_if_rss_high():
+    """Run gc.collect() only when the process is close to its memory limit"""
     try:
-        import torch
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        from psutil import Process
     except ImportError:
-        pass
+        return
+    limit = app.conf.worker_max_memory_per_child
+    if limit and Process().memory_info().rss > GC_RSS_HIGH_WATERMARK * limit * 1024:
+        import gc
+        gc.collect()
 
 
 @signals.task_postrun.connect
 def after_task_run(task_id, task, *args, **kwargs):
     """Run after each task."""
-    # Clear CUDA cache after each task to free memory
+    global _tasks_since_empty_cache
+    
+    _collect_if_rss_high()
+    
+    # Start the idle countdown for moving cached models off the GPU
+    from audio.tasks import schedule_model_offload
+    schedule_model_offload()
+    
+    # Only clear the CUDA cache every CUDA_EMPTY_CACHE_INTERVAL tasks or
+    # when the allocator is close to the device limit; an unconditional
+    # empty_cache() forces a full allocator sweep and re-allocation on the
+    # next task. No synchronize() is needed: the allocator tracks pending
+    # frees per stream.
     try:
         import torch
-        if torch.cuda.is_available():
+        # Workers that never used the GPU have nothing cached; querying the
+        # device would create a CUDA context in them
+        if not torch.cuda.is_available() or not torch.cuda.is_initialized():
+            return
+        _tasks_since_empty_cache += 1
+        reserved = torch.cuda.memory_reserved()
+        allocated = torch.cuda.memory_allocated()
+        total = torch.cuda.get_device_properties(0).total_memory
+        if (_tasks_since_empty_cache >= CUDA_EMPTY_CACHE_INTERVAL
+                or (reserved > CUDA_RESERVED_THRESHOLD * total
+                    and reserved - allocated > CUDA_UNUSED_THRESHOLD * reserved)):
             torch.cuda.empty_cache()
+            _tasks_since_empty_cache = 0
     except ImportError:
         pass
@@ -2,19 +2,37 @@
 Health check endpoints for monitoring the application.
 """
 import logging
-from datetime import datetime
+import time
 from http import HTTPStatus
 
 from django.conf import settings
 from django.core.cache import cache
 from django.db import connections, DatabaseError
-from django.http import JsonResponse
 from django.views import View
-from redis import Redis
+from django_redis import get_redis_connection
 from redis.exceptions import RedisError
 
+from app.responses import OrjsonResponse
+
 logger = logging.getLogger(__name__)
 
+# Settings reported by the health checks, resolved once at import time
+_DB_NAME = settings.DATABASES['default'].get('NAME', 'unknown')
+_DB_BACKEND = settings.DATABASES['default'].get('ENGINE', 'unknown').rsplit('.', 1)[-1]
+_REDIS_LOC = settings.CACHES['default'].get('LOCATION', '').rsplit('@', 1)[-1]
+
+# Last formatted timestamp, regenerated at most once per second
+_cached_timestamp = (0, '')
+
+
+def _utc_timestamp():
+    """Return the current UTC time as an ISO 8601 string with second resolution."""
+    global _cached_timestamp
+    now = int(time.time())
+    if now != _cached_timestamp[0]:
+        _cached_timestamp = (now, time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now)))
+    return _cached_timestamp[1]
+
 
 class HealthCheckView(View):
     """
@@ -25,12 +43,12 @@ class HealthCheckView(View):
         Handle GET request to health check endpoint.
         
         Returns:
-            JsonResponse: JSON response with health check status and details.
+            OrjsonResponse: JSON response with health check status and details.
         """
         # Default response data
         response_data = {
             'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': _utc_timestamp(),
             'checks': {}
         }
         
@@ -52,7 +70,7 @@ class HealthCheckView(View):
             else HTTPStatus.SERVICE_UNAVAILABLE
         )
         
-        return JsonResponse(response_data, status=status_code)
+        return OrjsonResponse(response_data, status=status_code)
     
     def _check_database(self):
         """Check if the database is accessible."""
@@ -60,28 +78,27 @@ class HealthCheckView(View):
             connections['default'].ensure_connection()
             return {
                 'status': 'healthy',
-                'database': settings.DATABASES['default']['NAME'],
-                'backend': settings.DATABASES['default']['ENGINE'].split('.')[-1],
+                'database': _DB_NAME,
+                'backend': _DB_BACKEND,
             }
         except DatabaseError as e:
             logger.error(f"Database health check failed: {str(e)}")
             return {
                 'status': 'unhealthy',
                 'error': str(e),
-                'database': settings.DATABASES['default'].get('NAME', 'unknown'),
-                'backend': settings.DATABASES['default'].get('ENGINE', 'unknown').split('.')[-1],
+                'database': _DB_NAME,
+                'backend': _DB_BACKEND,
             }
     
     def _check_cache(self):
         """Check if the cache (Redis) is accessible."""
         try:
-            # Test Redis connection
-            redis = Redis.from_url(settings.CACHES['default']['LOCATION'])
-            redis.ping()
+            # Test Redis connection using the cache's pooled client
+            get_redis_connection('default').ping()
             return {
                 'status': 'healthy',
                 'backend': 'redis',
-                'location': settings.CACHES['default']['LOCATION'].split('@')[-1],
+                'location': _REDIS_LOC,
             }
         except (RedisError, KeyError, AttributeError) as e:
             logger.error(f"Cache health check failed: {str(e)}")
@@ -98,7 +115,7 @@ def health_check(request):
     This is useful for load balancers and container orchestration systems
     that need a simple endpoint to check if the application is running.
     """
-    return JsonResponse({
+    return OrjsonResponse({
         'status': 'ok',
-        'timestamp': datetime.utcnow().isoformat(),
+        'timestamp': _utc_timestamp(),
     })
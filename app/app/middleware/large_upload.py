@@ -1,30 +1,19 @@
 """
 Middleware to handle large file uploads for superusers.
 """
-from django.conf import settings
 from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 
 class LargeUploadMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        self.superuser_max_size = getattr(settings, 'SUPERUSER_UPLOAD_MAX_MEMORY_SIZE', 0)  # 0 means no limit
 
     def __call__(self, request):
-        # Only modify settings for superusers
+        # Stream superuser uploads straight to disk. This has to happen before
+        # anything reads request.POST/FILES, and only affects this request.
         if hasattr(request, 'user') and request.user.is_superuser:
-            # Save original settings
-            original_data_upload = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
-            original_file_upload = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
-            
-            # Apply superuser limits
-            if self.superuser_max_size > 0:
-                settings.DATA_UPLOAD_MAX_MEMORY_SIZE = self.superuser_max_size
-                settings.FILE_UPLOAD_MAX_MEMORY_SIZE = self.superuser_max_size
-            else:
-                # Use a very large number for superusers (effectively no limit)
-                settings.DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024 * 10  # 10GB
-                settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024 * 10  # 10GB
-        
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+
         try:
             response = self.get_response(request)
             return response
@@ -37,8 +26,3 @@ class LargeUploadMiddleware:
             return HttpResponseForbidden(
                 "File too large. Please contact an administrator for assistance with large files."
             )
-        finally:
-            # Restore original settings
-            if hasattr(request, 'user') and request.user.is_superuser:
-                settings.DATA_UPLOAD_MAX_MEMORY_SIZE = original_data_upload
-                settings.FILE_UPLOAD_MAX_MEMORY_SIZE = original_file_upload
@@ -0,0 +1,14 @@
+"""
+Response classes shared across the project.
+"""
+import orjson
+from django.http import HttpResponse
+
+
+class OrjsonResponse(HttpResponse):
+    """
+    JSON response serialized with orjson, which encodes straight to bytes.
+    """
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(orjson.dumps(data, option=orjson.OPT_UTC_Z), **kwargs)
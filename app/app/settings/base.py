@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     
     # Third-party apps
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     'storages',
     'django_celery_beat',
@@ -81,7 +82,7 @@ ROOT_URLCONF = 'app.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -104,8 +105,8 @@ FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10240  # Higher than default 1000
 
-# Superuser upload limits (10GB)
-SUPERUSER_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024 * 10  # 10GB
+# Superuser uploads are always streamed to temporary files on disk
+# (see app.middleware.large_upload.LargeUploadMiddleware)
 
 # Database configuration
 def get_database_config():
@@ -152,13 +153,13 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'static']
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = BASE_DIR / 'media'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -261,8 +262,35 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
 
+# Set to 'cpp' to transcribe with whisper.cpp (pywhispercpp) on machines
+# without a GPU; by default faster-whisper is used when installed
+WHISPER_BACKEND = os.getenv('WHISPER_BACKEND', '')
+
+# Length of the per-worker Whisper input buffer; longer files are read from disk
+WHISPER_MAX_BUFFER_SECONDS = int(os.getenv('WHISPER_MAX_BUFFER_SECONDS', '600'))
+
+# Use distilled Whisper checkpoints for English audio on the small, medium and
+# large tiers; turn off for jobs that need the original models' accuracy
+WHISPER_DISTIL_MODELS = os.getenv('WHISPER_DISTIL_MODELS', 'True') == 'True'
+
+# Seconds without a task after which a GPU worker moves its cached models
+# to CPU memory; 0 keeps them on the GPU
+WHISPER_IDLE_OFFLOAD_SECONDS = int(os.getenv('WHISPER_IDLE_OFFLOAD_SECONDS', '30'))
+
+# Maximum number of short pending transcriptions decoded together; 1 turns
+# batching off and enqueues one task per upload instead
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', '8'))
+
+# Directory for cached 16kHz diarization waveforms; caching is disabled when unset
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR') or None
+
 # Task routing
 CELERY_TASK_ROUTES = {
+    # CPU-bound ffmpeg extraction runs on its own workers, away from the GPU ones
+    'audio.tasks.extract_audio_task': {'queue': 'ffmpeg'},
+    # Transcription runs on single-process GPU workers (--pool=solo)
+    'audio.tasks.process_audio_task': {'queue': 'gpu'},
+    'audio.tasks.batch_process_audio_task': {'queue': 'gpu'},
     'audio.tasks.*': {'queue': 'audio'},
     'subscriptions.tasks.*': {'queue': 'subscriptions'},
     'django_celery_beat.*': {'queue': 'celery'},
@@ -284,6 +312,14 @@ CELERY_RESULT_BACKEND_TRANSPORT_OPTIONS = {
 # Beat settings
 CELERY_BEAT_MAX_LOOP_INTERVAL = 300  # 5 minutes
 CELERY_BEAT_SYNC_EVERY = 1  # Sync every second
+CELERY_BEAT_SCHEDULE = {}
+if WHISPER_BATCH_SIZE > 1:
+    CELERY_BEAT_SCHEDULE['batch-process-audio'] = {
+        'task': 'audio.tasks.batch_process_audio_task',
+        'schedule': 1.0,
+        # Drop polls that pile up while the GPU workers are busy
+        'options': {'expires': 5},
+    }
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -294,7 +330,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CreatedAtCursorPagination',
     'PAGE_SIZE': 10
 }
 
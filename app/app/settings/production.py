@@ -2,6 +2,7 @@
 Production settings for the Speech to Text application.
 """
 import os
+import socket
 from .base import *
 
 # Security settings
@@ -30,6 +31,13 @@ DATABASES = {
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
         'CONN_MAX_AGE': 600,  # 10 minutes connection lifetime
+        'CONN_HEALTH_CHECKS': True,  # Validate persistent connections before reuse
+        # Server-side parameter binding lets psycopg 3 prepare repeated queries
+        'OPTIONS': {
+            'server_side_binding': True,
+        },
+        # Server-side cursors don't survive pgbouncer's transaction pooling
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_USE_PGBOUNCER', 'False') == 'True',
     }
 }
 
@@ -44,12 +52,39 @@ CACHES = {
             'SOCKET_CONNECT_TIMEOUT': 5,  # 5 seconds
             'SOCKET_TIMEOUT': 5,  # 5 seconds
             'IGNORE_EXCEPTIONS': True,
-            'PARSER_CLASS': 'redis.connection.HiredisParser',
+            # Cached values are plain data; msgpack is faster and smaller than pickle
+            'SERIALIZER': 'django_redis.serializers.msgpack.MSGPackSerializer',
+            # redis-py 5 picks the hiredis parser automatically when installed
+            'CONNECTION_POOL_KWARGS': {
+                'max_connections': 50,
+                'protocol': 3,  # RESP3
+                'socket_keepalive': True,
+                'socket_keepalive_options': {socket.TCP_KEEPIDLE: 30},
+            },
         },
         'KEY_PREFIX': 'speech2text',
-    }
+    },
+    # Sessions get their own Redis database, and with it their own connection
+    # pool, and keep pickle since session data may hold arbitrary objects
+    'sessions': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('REDIS_SESSIONS_URL', 'redis://:redispass@redis:6379/2'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'PASSWORD': os.getenv('REDIS_PASSWORD', 'redispass'),
+            'SOCKET_CONNECT_TIMEOUT': 5,  # 5 seconds
+            'SOCKET_TIMEOUT': 10,  # 10 seconds
+            'IGNORE_EXCEPTIONS': True,
+            'SERIALIZER': 'django_redis.serializers.pickle.PickleSerializer',
+        },
+        'KEY_PREFIX': 'speech2text',
+    },
 }
 
+# Sessions
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+SESSION_CACHE_ALIAS = 'sessions'
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -61,12 +96,15 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@example.com')
 
 # Static files
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# collectstatic writes .br files next to the .gz ones when brotli is installed
+WHITENOISE_MAX_AGE = 31536000  # 1 year
+WHITENOISE_USE_FINDERS = False
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = BASE_DIR / 'media'
 
 # Logging
 LOGGING = {
@@ -144,11 +182,12 @@ if os.getenv('HTTPS', 'False') == 'True':
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.OrjsonRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        # Token lookups are cached; avoids per-request session reads and
+        # password hashing from Basic auth
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -161,6 +200,6 @@ REST_FRAMEWORK = {
         'anon': '100/day',
         'user': '1000/day'
     },
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CreatedAtCursorPagination',
     'PAGE_SIZE': 20
 }
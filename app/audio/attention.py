@@ -0,0 +1,63 @@
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Set once the attention backends have been configured in this process
+_SDP_CONFIGURED = False
+
+
+def configure_attention():
+    """Enable flash and memory-efficient attention once per process on capable GPUs"""
+    global _SDP_CONFIGURED
+
+    if _SDP_CONFIGURED:
+        return
+    _SDP_CONFIGURED = True
+
+    if not torch.cuda.is_available():
+        return
+
+    # PyTorch's SDPA ships its own flash and memory-efficient kernels, so no
+    # extra package is needed. Flash attention requires SM80 (Ampere) or
+    # newer; older GPUs still get the memory-efficient kernel.
+    flash = torch.cuda.get_device_capability()[0] >= 8
+    torch.backends.cuda.enable_flash_sdp(flash)
+    torch.backends.cuda.enable_mem_efficient_sdp(True)
+    if flash:
+        logger.info("Enabled flash and memory-efficient attention")
+    else:
+        logger.info("GPU does not support flash attention, using memory-efficient attention")
+
+
+def _sdpa_qkv_attention(self, q, k, v, mask=None):
+    """Drop-in for whisper's MultiHeadAttention.qkv_attention using fused SDPA kernels"""
+    n_batch, n_ctx, n_state = q.shape
+    q = q.view(n_batch, n_ctx, self.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+    v = v.view(*v.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
+    attn_mask = mask[:n_ctx, :n_ctx] if mask is not None else None
+    out = torch.nn.functional.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask)
+    # Attention weights are never materialized, so there is no qk to return
+    return out.permute(0, 2, 1, 3).flatten(start_dim=2), None
+
+
+def use_fused_encoder_attention(model):
+    """
+    Route an openai-whisper model's encoder self-attention through
+    scaled_dot_product_attention, which uses the flash attention kernel
+    for FP16 inputs on SM80+ GPUs
+
+    Only applies to openai-whisper models; faster-whisper (CTranslate2)
+    models are returned from _load_whisper_model before this is reached.
+
+    Decoder attention is left alone: word timestamps read the cross-attention
+    weights that the fused kernels don't produce.
+    """
+    encoder = getattr(model, 'encoder', None)
+    if encoder is None or not hasattr(torch.nn.functional, 'scaled_dot_product_attention'):
+        return
+
+    for block in encoder.blocks:
+        block.attn.qkv_attention = _sdpa_qkv_attention.__get__(block.attn)
+    logger.info(f"Using fused attention for {len(encoder.blocks)} encoder layers")
@@ -0,0 +1,96 @@
+import logging
+import torch
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Whisper expects mono audio sampled at 16kHz
+SAMPLE_RATE = 16000
+
+# Persistent per-process input buffers, allocated once on worker start-up
+_pinned_buffer = None
+_device_buffer = None
+
+
+def allocate_buffers():
+    """Reserve the pinned host and CUDA input buffers for this worker process"""
+    global _pinned_buffer, _device_buffer
+
+    if _device_buffer is not None or not torch.cuda.is_available():
+        return
+
+    max_samples = int(getattr(settings, 'WHISPER_MAX_BUFFER_SECONDS', 600) * SAMPLE_RATE)
+    try:
+        _device_buffer = torch.empty(max_samples, dtype=torch.float32, device='cuda')
+        _pinned_buffer = torch.empty(max_samples, dtype=torch.float32).pin_memory()
+        logger.info(f"Allocated Whisper input buffers for {max_samples} samples")
+    except RuntimeError as e:
+        logger.warning(f"Could not allocate Whisper input buffers: {e}")
+        _pinned_buffer = None
+        _device_buffer = None
+
+
+def buffers_allocated():
+    """Check if the persistent input buffers are available"""
+    return _device_buffer is not None
+
+
+def stage_audio(audio):
+    """
+    Load audio into the persistent CUDA input buffer
+
+    Args:
+        audio: Path to the audio file, or 16kHz mono float32 samples
+
+    Returns:
+        A view of the device buffer holding the waveform, or None if the
+        buffers are not allocated or the audio does not fit
+    """
+    if not buffers_allocated():
+        return None
+
+    from whisper.audio import load_audio
+
+    if isinstance(audio, str):
+        audio = load_audio(audio, sr=SAMPLE_RATE)
+    audio = torch.from_numpy(audio)
+    num_samples = audio.shape[0]
+    if num_samples > _device_buffer.shape[0]:
+        return None
+
+    _pinned_buffer[:num_samples].copy_(audio)
+    _device_buffer[:num_samples].copy_(_pinned_buffer[:num_samples], non_blocking=True)
+    return _device_buffer[:num_samples]
+
+
+def stage_batch(clips, clip_samples):
+    """
+    Load a batch of clips into the persistent CUDA input buffer in one copy
+
+    Each clip is trimmed or zero-padded to clip_samples, so the batch is a
+    single contiguous block and the host to device transfer is one DMA from
+    pinned memory rather than a pageable copy per clip.
+
+    Args:
+        clips: 16kHz mono float32 sample arrays
+        clip_samples: Length of every row in the staged batch
+
+    Returns:
+        A (len(clips), clip_samples) view of the device buffer, or None if
+        the buffers are not allocated or the batch does not fit
+    """
+    if not buffers_allocated():
+        return None
+
+    total = len(clips) * clip_samples
+    if total > _device_buffer.shape[0]:
+        return None
+
+    host = _pinned_buffer[:total].view(len(clips), clip_samples)
+    host.zero_()
+    for row, clip in zip(host, clips):
+        clip = torch.from_numpy(clip[:clip_samples])
+        row[:clip.shape[0]].copy_(clip)
+    device = _device_buffer[:total].view(len(clips), clip_samples)
+    device.copy_(host, non_blocking=True)
+    return device
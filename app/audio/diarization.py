@@ -1,11 +1,16 @@
 import os
+import functools
+import hashlib
 import torch
 import torchaudio
+import julius
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 import json
 import logging
+from pathlib import Path
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +37,9 @@ DEFAULT_SPEAKER_COLORS = [
     "#17becf",  # cyan
 ]
 
+# Diarization turns shorter than this (in seconds) are discarded
+MIN_SEGMENT_DURATION = 0.2
+
 @dataclass
 class DiarizationResult:
     """Container for diarization results"""
@@ -45,6 +53,7 @@ class SpeakerDiarizer:
     def __init__(self, auth_token: Optional[str] = None):
         """Initialize the diarizer with an optional auth token for Hugging Face Hub"""
         self.pipeline = None
+        self.device = torch.device("cpu")
         self.auth_token = auth_token or os.getenv('HUGGINGFACE_TOKEN')
         self._load_model()
     
@@ -66,6 +75,118 @@ class SpeakerDiarizer:
         except Exception as e:
             logger.error(f"Failed to load diarization model: {e}")
             self.pipeline = None
+            return
+        
+        # The diarizer is only used for inference; autograd is never needed
+        torch.set_grad_enabled(False)
+        
+        # Run the pipeline on the GPU when one is available
+        if torch.cuda.is_available():
+            try:
+                self.pipeline.to(torch.device("cuda"))
+                self.device = torch.device("cuda")
+                logger.info("Moved speaker diarization model to GPU")
+                self._convert_models_to_half()
+            except Exception as e:
+                logger.warning(f"Failed to move diarization model to GPU, using CPU: {e}")
+                self.pipeline.to(torch.device("cpu"))
+                self.device = torch.device("cpu")
+
+        self._compile_models()
+
+    def _convert_models_to_half(self):
+        """Keep the segmentation and embedding weights in FP16 on the GPU"""
+        try:
+            self.pipeline._segmentation.model.half()
+            embedding = self.pipeline._embedding
+            if hasattr(embedding, "model_"):
+                embedding.model_.half()
+            logger.info("Converted speaker diarization models to FP16")
+        except Exception as e:
+            logger.warning(f"Failed to convert diarization models to FP16: {e}")
+
+    def _compile_models(self):
+        """Compile the segmentation and embedding models with torch.compile on the GPU"""
+        # torch.compile only exists on PyTorch 2.x; CUDA graphs need a GPU
+        if not hasattr(torch, "compile") or self.device.type != "cuda":
+            return
+
+        try:
+            segmentation = self.pipeline._segmentation
+            segmentation.model = torch.compile(segmentation.model, mode="reduce-overhead")
+
+            embedding = self.pipeline._embedding
+            if hasattr(embedding, "model_"):
+                embedding.model_ = torch.compile(embedding.model_, mode="reduce-overhead")
+            logger.info("Compiled speaker diarization models")
+        except Exception as e:
+            logger.warning(f"Failed to compile diarization models, using eager mode: {e}")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _get_resampler(orig_freq: int, device: torch.device) -> julius.ResampleFrac:
+        """Get a cached Julius resampler from orig_freq to 16kHz on the given device"""
+        return julius.ResampleFrac(orig_freq, 16000).to(device)
+    
+    def _waveform_cache_path(self, audio_path: str, start: float, duration: Optional[float]) -> Optional[Path]:
+        """Get the cache file for the decoded 16kHz waveform, or None if caching is disabled"""
+        cache_dir = getattr(settings, 'AUDIO_CACHE_DIR', None)
+        if not cache_dir:
+            return None
+        
+        stat = os.stat(audio_path)
+        key = f"{os.path.abspath(audio_path)}:{stat.st_mtime_ns}:{stat.st_size}:{start}:{duration}"
+        return Path(cache_dir) / f"{hashlib.sha1(key.encode()).hexdigest()}.pt"
+    
+    def _load_waveform(
+        self,
+        audio_path: str,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+        source_rate: Optional[int] = None
+    ) -> Tuple[torch.Tensor, int]:
+        """Load an audio range as a 16kHz waveform on the pipeline's device"""
+        cache_path = self._waveform_cache_path(audio_path, start, duration)
+        if cache_path is not None and cache_path.exists():
+            try:
+                return torch.load(cache_path, map_location=self.device), 16000
+            except Exception as e:
+                logger.warning(f"Failed to load cached waveform {cache_path}: {e}")
+        
+        # Load audio file, decoding only the requested range
+        frame_offset = 0
+        num_frames = -1
+        if start or duration:
+            if source_rate is None:
+                source_rate = torchaudio.info(audio_path).sample_rate
+            frame_offset = int(start * source_rate)
+            if duration:
+                num_frames = int(duration * source_rate)
+        waveform, sample_rate = torchaudio.load(
+            audio_path, frame_offset=frame_offset, num_frames=num_frames
+        )
+        
+        # Multi-channel audio is left as is; pyannote downmixes to mono itself
+        
+        # Move to the pipeline's device so resampling runs there too; pinned
+        # memory lets the copy run as an asynchronous DMA transfer
+        if self.device.type == "cuda":
+            waveform = waveform.pin_memory().to(self.device, non_blocking=True)
+        
+        # Resample to 16kHz if needed (required by pyannote)
+        if sample_rate != 16000:
+            resampler = self._get_resampler(sample_rate, waveform.device)
+            waveform = resampler(waveform)
+            sample_rate = 16000
+        
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                torch.save(waveform.cpu(), cache_path)
+            except Exception as e:
+                logger.warning(f"Failed to cache waveform {cache_path}: {e}")
+        
+        return waveform, sample_rate
     
     def is_available(self) -> bool:
         """Check if diarization is available"""
@@ -75,7 +196,9 @@ class SpeakerDiarizer:
         self, 
         audio_path: str, 
         min_speakers: Optional[int] = None,
-        max_speakers: Optional[int] = None
+        max_speakers: Optional[int] = None,
+        start: float = 0.0,
+        duration: Optional[float] = None
     ) -> Optional[DiarizationResult]:
         """
         Process an audio file to identify speakers
@@ -84,6 +207,8 @@ class SpeakerDiarizer:
             audio_path: Path to the audio file
             min_speakers: Minimum number of speakers (optional)
             max_speakers: Maximum number of speakers (optional)
+            start: Offset in seconds to start reading the audio from
+            duration: Number of seconds to process (optional, defaults to the rest of the file)
             
         Returns:
             DiarizationResult with segments and speaker info, or None if processing failed
@@ -93,69 +218,158 @@ class SpeakerDiarizer:
             return None
         
         try:
-            # Load audio file
-            waveform, sample_rate = torchaudio.load(audio_path)
-            
-            # Convert to mono if needed
-            if len(waveform.shape) > 1 and waveform.shape[0] > 1:
-                waveform = torch.mean(waveform, dim=0, keepdim=True)
-            
-            # Resample to 16kHz if needed (required by pyannote)
-            if sample_rate != 16000:
-                resampler = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=16000)
-                waveform = resampler(waveform)
-                sample_rate = 16000
-            
-            # Prepare input for pyannote
-            audio_input = {
-                "waveform": waveform,
-                "sample_rate": sample_rate
-            }
-            
-            # Run diarization
-            diarization = self.pipeline(audio_input, min_speakers=min_speakers, max_speakers=max_speakers)
-            
-            # Process results
-            segments = []
-            speaker_ids = set()
-            
-            # Get audio duration
-            audio_duration = waveform.shape[1] / sample_rate
+            # Get audio duration from the file header rather than the decoded samples
+            info = torchaudio.info(audio_path)
+            audio_duration = max(info.num_frames / info.sample_rate - start, 0.0)
+            if duration:
+                audio_duration = min(audio_duration, duration)
             
-            for turn, _, speaker in diarization.itertracks(yield_label=True):
-                speaker_id = str(speaker)
-                speaker_ids.add(speaker_id)
-                
-                segments.append({
-                    "start": round(turn.start, 2),
-                    "end": round(turn.end, 2),
-                    "speaker": speaker_id,
-                    "text": ""  # Will be filled in by the transcription
-                })
+            waveform, sample_rate = self._load_waveform(
+                audio_path, start, duration, source_rate=info.sample_rate
+            )
             
-            # Sort segments by start time
-            segments.sort(key=lambda x: x["start"])
+            # Some containers don't report a frame count in their header
+            if not info.num_frames:
+                audio_duration = waveform.shape[1] / sample_rate
             
-            # Create speaker info with colors
-            speaker_ids = sorted(list(speaker_ids))
-            speakers = []
+            return self._diarize(
+                waveform, sample_rate, audio_duration, start, min_speakers, max_speakers
+            )
             
-            for i, speaker_id in enumerate(speaker_ids):
-                speakers.append({
-                    "id": speaker_id,
-                    "name": f"Speaker {i+1}",
-                    "color": DEFAULT_SPEAKER_COLORS[i % len(DEFAULT_SPEAKER_COLORS)]
-                })
+        except Exception as e:
+            logger.error(f"Error during diarization: {e}", exc_info=True)
+            return None
+    
+    def process_waveform(
+        self,
+        samples: np.ndarray,
+        sample_rate: int = 16000,
+        min_speakers: Optional[int] = None,
+        max_speakers: Optional[int] = None
+    ) -> Optional[DiarizationResult]:
+        """
+        Identify speakers in already decoded mono audio
+        
+        Args:
+            samples: 1-D float32 samples
+            sample_rate: Sample rate of the samples
+            min_speakers: Minimum number of speakers (optional)
+            max_speakers: Maximum number of speakers (optional)
             
-            return DiarizationResult(
-                segments=segments,
-                speakers=speakers,
-                audio_duration=audio_duration
+        Returns:
+            DiarizationResult with segments and speaker info, or None if processing failed
+        """
+        if not self.is_available():
+            logger.error("Diarization is not available")
+            return None
+        
+        try:
+            waveform = torch.from_numpy(samples).unsqueeze(0)
+            if self.device.type == "cuda":
+                waveform = waveform.pin_memory().to(self.device, non_blocking=True)
+            if sample_rate != 16000:
+                waveform = self._get_resampler(sample_rate, waveform.device)(waveform)
+            audio_duration = len(samples) / sample_rate
+            return self._diarize(
+                waveform, 16000, audio_duration, 0.0, min_speakers, max_speakers
             )
-            
         except Exception as e:
             logger.error(f"Error during diarization: {e}", exc_info=True)
             return None
+    
+    def _diarize(
+        self,
+        waveform: torch.Tensor,
+        sample_rate: int,
+        audio_duration: float,
+        start: float,
+        min_speakers: Optional[int],
+        max_speakers: Optional[int]
+    ) -> DiarizationResult:
+        """Run the pipeline on a waveform and build the result, offsetting times by start"""
+        # Prepare input for pyannote
+        audio_input = {
+            "waveform": waveform,
+            "sample_rate": sample_rate
+        }
+        
+        # Run diarization without autograd tracking, in FP16 on the GPU
+        with torch.inference_mode(), torch.autocast(
+            device_type=self.device.type,
+            dtype=torch.float16,
+            enabled=self.device.type == "cuda"
+        ):
+            diarization = self.pipeline(audio_input, min_speakers=min_speakers, max_speakers=max_speakers)
+        
+        # Process results
+        segments = []
+        # Speaker label -> speaker id, in order of first appearance
+        speaker_map = {}
+        
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            # Drop micro-turns; they carry almost no overlap for the merge
+            if turn.end - turn.start < MIN_SEGMENT_DURATION:
+                continue
+            
+            speaker_id = speaker_map.get(speaker)
+            if speaker_id is None:
+                speaker_id = speaker_map[speaker] = str(speaker)
+            
+            segments.append({
+                "start": round(start + turn.start, 2),
+                "end": round(start + turn.end, 2),
+                "speaker": speaker_id,
+                "text": ""  # Will be filled in by the transcription
+            })
+        
+        # Sort segments by start time
+        segments.sort(key=lambda x: x["start"])
+        
+        # Create speaker info with colors, numbered by first appearance
+        speakers = [
+            {
+                "id": speaker_id,
+                "name": f"Speaker {i+1}",
+                "color": DEFAULT_SPEAKER_COLORS[i % len(DEFAULT_SPEAKER_COLORS)]
+            }
+            for i, speaker_id in enumerate(speaker_map.values())
+        ]
+        
+        return DiarizationResult(
+            segments=segments,
+            speakers=speakers,
+            audio_duration=audio_duration
+        )
+        
+
+# Process-wide diarizer, so the pipeline weights are loaded once per process
+_DIARIZER: Optional[SpeakerDiarizer] = None
+
+def get_diarizer() -> SpeakerDiarizer:
+    """
+    Get the shared SpeakerDiarizer, creating it on first use
+
+    Only call this where diarization actually runs: loading the pipeline
+    initializes CUDA, which must not happen in a prefork parent process.
+    """
+    global _DIARIZER
+    if _DIARIZER is None:
+        _DIARIZER = SpeakerDiarizer()
+    return _DIARIZER
+
+def get_available_diarizer() -> Optional[SpeakerDiarizer]:
+    """Get the shared SpeakerDiarizer, or None if its pipeline can't be loaded"""
+    if not DIARIZATION_AVAILABLE:
+        return None
+    try:
+        diarizer = get_diarizer()
+    except Exception as e:
+        logger.error(f"Failed to initialize speaker diarizer: {e}")
+        return None
+    if not diarizer.is_available():
+        logger.warning("Speaker diarization is not available")
+        return None
+    return diarizer
 
 def merge_transcription_with_diarization(
     transcription_segments: List[Dict[str, Any]],
@@ -171,48 +385,72 @@ def merge_transcription_with_diarization(
     Returns:
         List of segments with both text and speaker information
     """
-    if not diarization_segments:
+    if not diarization_segments or not transcription_segments:
         return transcription_segments
     
-    result = []
-    diarization_idx = 0
+    count = len(transcription_segments)
+    seg_starts = np.fromiter((seg.get('start', 0) for seg in transcription_segments), np.float64, count)
+    seg_ends = np.fromiter((seg.get('end', np.inf) for seg in transcription_segments), np.float64, count)
     
-    for seg in transcription_segments:
-        seg_start = seg.get('start', 0)
-        seg_end = seg.get('end', float('inf'))
-        
-        # Find overlapping diarization segments
-        overlapping_speakers = {}
-        
-        # Find all diarization segments that overlap with this transcription segment
-        for diar_seg in diarization_segments:
-            diar_start = diar_seg['start']
-            diar_end = diar_seg['end']
-            
-            # Check for overlap
-            if diar_start < seg_end and diar_end > seg_start:
-                # Calculate overlap duration
-                overlap_start = max(seg_start, diar_start)
-                overlap_end = min(seg_end, diar_end)
-                overlap_duration = max(0, overlap_end - overlap_start)
-                
-                # Track speaker and their total overlap time
-                speaker = diar_seg['speaker']
-                if speaker in overlapping_speakers:
-                    overlapping_speakers[speaker] += overlap_duration
-                else:
-                    overlapping_speakers[speaker] = overlap_duration
-        
-        # Find the speaker with the most overlap
-        speaker = None
-        if overlapping_speakers:
-            speaker = max(overlapping_speakers.items(), key=lambda x: x[1])[0]
-        
-        # Create a new segment with speaker info
+    # The sort is stable so turns that start together keep their original order
+    diarization_segments = sorted(diarization_segments, key=lambda x: x['start'])
+    turn_starts = np.array([turn['start'] for turn in diarization_segments], np.float64)
+    turn_ends = np.array([turn['end'] for turn in diarization_segments], np.float64)
+    turn_speakers = [turn['speaker'] for turn in diarization_segments]
+    position = {speaker: k for k, speaker in enumerate(dict.fromkeys(turn_speakers))}
+    speakers = list(position)
+    speaker_index = np.fromiter((position[speaker] for speaker in turn_speakers), np.intp, len(turn_speakers))
+    
+    # Overlap of every segment with every speaker's speech, and the first
+    # turn (in start order) of each speaker that touches the segment, as
+    # (speakers, segments) matrices
+    no_turn = len(diarization_segments)
+    overlaps = np.empty((len(speakers), count))
+    first_turn = np.empty((len(speakers), count), np.intp)
+    for k in range(len(speakers)):
+        indices = np.flatnonzero(speaker_index == k)
+        starts, ends = turn_starts[indices], turn_ends[indices]
+        overlaps[k] = _speech_before(starts, ends, seg_ends) - _speech_before(starts, ends, seg_starts)
+        # The first turn ending after the segment starts is the first one
+        # whose running maximum end does; the turns may overlap, so their
+        # ends alone aren't sorted
+        nxt = np.searchsorted(np.maximum.accumulate(ends), seg_starts, side='right')
+        touches = nxt < len(indices)
+        nxt = np.minimum(nxt, len(indices) - 1)
+        touches &= starts[nxt] < seg_ends
+        first_turn[k] = np.where(touches, indices[nxt], no_turn)
+    
+    # Pick the speaker with the most overlap. Ties (common when speech
+    # overlaps) go to the speaker whose turn starts first; zero-length
+    # segments tie at no overlap and get the first turn that contains them.
+    overlaps = np.round(overlaps, 6)
+    tied = overlaps == overlaps.max(axis=0)
+    chosen = np.where(tied, first_turn, no_turn).min(axis=0)
+    
+    result = []
+    for seg, turn in zip(transcription_segments, chosen):
         new_seg = seg.copy()
-        if speaker:
-            new_seg['speaker'] = speaker
-        
+        if turn < no_turn:
+            new_seg['speaker'] = turn_speakers[turn]
         result.append(new_seg)
     
     return result
+
+
+def _speech_before(starts, ends, times):
+    """
+    Total duration of turns that lies before each time, summed per turn
+
+    Each turn contributes max(t - start, 0) - max(t - end, 0), so this holds
+    for overlapping turns too (pyannote can emit them for one speaker), and
+    like the per-turn loop it replaced counts time they share once per turn.
+    """
+    starts, ends = np.sort(starts), np.sort(ends)
+    started = np.searchsorted(starts, times, side='right')
+    ended = np.searchsorted(ends, times, side='right')
+    # Sums of the first i starts and ends, for i = 0..len(turns)
+    start_sums = np.concatenate(([0.0], np.cumsum(starts)))
+    end_sums = np.concatenate(([0.0], np.cumsum(ends)))
+    # Turns still running at each time; none are at an infinite time
+    running = started - ended
+    return end_sums[ended] - start_sums[started] + running * np.where(running > 0, times, 0.0)
@@ -0,0 +1,83 @@
+import zlib
+import msgpack
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+class _Packed(bytes):
+    """Compressed MessagePack payload read from the database, not yet decoded"""
+
+    def decode_value(self):
+        return msgpack.unpackb(zlib.decompress(self), raw=False, strict_map_key=False)
+
+
+class CompressedJSONDescriptor(DeferredAttribute):
+    """Decode the stored payload on first access and keep the decoded value"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, _Packed):
+            value = value.decode_value()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedJSONField(models.BinaryField):
+    """
+    Stores JSON-compatible values as zlib-compressed MessagePack
+
+    Values are only decoded when the attribute is first read, so rows loaded
+    for other fields don't pay for parsing large segment lists.
+    """
+    descriptor_class = CompressedJSONDescriptor
+
+    def __init__(self, *args, **kwargs):
+        # BinaryField defaults to editable=False; these hold regular data
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('editable') is True:
+            del kwargs['editable']
+        else:
+            kwargs['editable'] = False
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return _Packed(value)
+
+    def to_python(self, value):
+        if isinstance(value, _Packed):
+            return value.decode_value()
+        return value
+
+    def pre_save(self, model_instance, add):
+        # Read the raw attribute so unchanged payloads are written back
+        # without being decoded and re-encoded
+        return model_instance.__dict__.get(self.attname)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, _Packed):
+            return value
+        return zlib.compress(msgpack.packb(value, use_bin_type=True))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return super().get_db_prep_value(value, connection, prepared=True)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        # Edit as JSON, skipping BinaryField's own form field handling
+        return models.Field.formfield(self, **{'form_class': forms.JSONField, **kwargs})
@@ -1,13 +1,37 @@
+import logging
+from functools import lru_cache
 from django import forms
 from django.conf import settings
 from .models import Transcription
 
+logger = logging.getLogger(__name__)
+
 # Import the subscription models
 try:
     from subscriptions.models import SubscriptionPlan
 except ImportError:
     SubscriptionPlan = None
 
+# All Whisper models offered in the upload form, smallest first
+_ALL_MODELS = (
+    ('tiny', 'Tiny (Fastest, lowest accuracy)'),
+    ('base', 'Base (Faster, lower accuracy)'),
+    ('small', 'Small (Good balance)'),
+    ('medium', 'Medium (Better accuracy)'),
+    ('large', 'Large (Best accuracy, slowest)'),
+)
+
+@lru_cache(maxsize=None)
+def _model_choices(available_models):
+    """
+    Model choices for a set of available models, built once per distinct set.
+    Models outside the set are still listed but marked as an upgrade.
+    """
+    return tuple(
+        (model_id, model_name if model_id in available_models else f"{model_name} (Upgrade required)")
+        for model_id, model_name in _ALL_MODELS
+    )
+
 class AudioUploadForm(forms.ModelForm):
     audio_file = forms.FileField(
         label='Audio File',
@@ -38,6 +62,23 @@ class AudioUploadForm(forms.ModelForm):
         initial='en'
     )
     
+    # Choices and initial value are filled in per user in __init__
+    model = forms.ChoiceField(
+        label='Transcription Model',
+        choices=_model_choices(frozenset(('tiny', 'base'))),
+        initial='base',
+        widget=forms.Select(attrs={
+            'class': 'form-select',
+            'id': 'model-select',  # Add ID for easier selection
+            'hx-get': '/check-model-availability/',
+            'hx-trigger': 'change',
+            'hx-target': '#model-warning',
+            'hx-swap': 'innerHTML',
+            'onchange': 'checkModelAvailability()'  # Ensure this fires on change
+        }),
+        help_text='Choose between speed and accuracy. Larger models are more accurate but slower.'
+    )
+    
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
@@ -46,82 +87,55 @@ class AudioUploadForm(forms.ModelForm):
         available_models = ['tiny', 'base']
         max_model = 'base'
         
-        # For debugging
-        print(f"Initializing form for user: {self.user}")
+        # Only build debug messages when debug logging is on
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"Initializing form for user: {self.user}")
         
         # Check if user is a superuser
         if self.user and self.user.is_authenticated and self.user.is_superuser:
-            print(f"Superuser detected: {self.user}")
+            if debug:
+                logger.debug(f"Superuser detected: {self.user}")
             # Grant access to all models for superusers
             available_models = ['tiny', 'base', 'small', 'medium', 'large']
             max_model = 'large'
         elif self.user and self.user.is_authenticated:
-            print(f"User is authenticated: {self.user}")
+            # Look the subscription up once; a missing one raises here
+            try:
+                subscription = self.user.subscription
+            except Exception:
+                subscription = None
+            
             # Check if user has a subscription with the correct attributes
-            if hasattr(self.user, 'subscription') and self.user.subscription and hasattr(self.user.subscription, 'plan'):
+            if subscription and hasattr(subscription, 'plan'):
                 try:
                     # Get available models based on subscription
-                    subscription = self.user.subscription.plan
-                    available_models = getattr(subscription, 'available_models', ['tiny', 'base'])
-                    max_model = getattr(subscription, 'max_model_size', 'base')
-                    print(f"Subscription found. Available models: {available_models}, Max model: {max_model}")
+                    plan = subscription.plan
+                    available_models = getattr(plan, 'available_models', ['tiny', 'base'])
+                    max_model = getattr(plan, 'max_model_size', 'base')
+                    if debug:
+                        logger.debug(f"Subscription found. Available models: {available_models}, Max model: {max_model}")
                 except Exception as e:
-                    print(f"Error getting subscription: {e}")
+                    logger.warning(f"Error getting subscription: {e}")
                     # Fall back to free tier on error
                     available_models = ['tiny', 'base']
                     max_model = 'base'
             else:
-                print("User has no valid subscription, using free tier models")
-                available_models = ['tiny', 'base']
-                max_model = 'base'
+                logger.debug("User has no valid subscription, using free tier models")
         else:
-            print("User is not authenticated, using free tier models")
-            available_models = ['tiny', 'base']
-            max_model = 'base'
-        
-        # Create model choices with all models, but mark unavailable ones
-        all_models = [
-            ('tiny', 'Tiny (Fastest, lowest accuracy)'),
-            ('base', 'Base (Faster, lower accuracy)'),
-            ('small', 'Small (Good balance)'),
-            ('medium', 'Medium (Better accuracy)'),
-            ('large', 'Large (Best accuracy, slowest)')
-        ]
+            logger.debug("User is not authenticated, using free tier models")
         
-        model_choices = []
-        for model_id, model_name in all_models:
-            if model_id in available_models:
-                model_choices.append((model_id, model_name))
-            else:
-                # Show upgrade message for unavailable models
-                model_choices.append((
-                    model_id,
-                    f"{model_name} (Upgrade required)"
-                ))
+        # Reused by clean() so the subscription is only looked up once
+        self.available_models = available_models
         
-        # Debug output
-        print(f"Available models: {available_models}")
-        print(f"Model choices: {model_choices}")
+        # Reuse the cached choices for these models, marking unavailable ones
+        model_choices = _model_choices(frozenset(available_models))
         
-        # Add model field
-        self.fields['model'] = forms.ChoiceField(
-            label='Transcription Model',
-            choices=model_choices,
-            initial=max_model if max_model in available_models else 'base',
-            widget=forms.Select(attrs={
-                'class': 'form-select',
-                'id': 'model-select',  # Add ID for easier selection
-                'hx-get': '/check-model-availability/',
-                'hx-trigger': 'change',
-                'hx-target': '#model-warning',
-                'hx-swap': 'innerHTML',
-                'onchange': 'checkModelAvailability()'  # Ensure this fires on change
-            }),
-            help_text='Choose between speed and accuracy. Larger models are more accurate but slower.'
-        )
+        if debug:
+            logger.debug(f"Model choices: {model_choices}")
         
-        # Debug the form fields
-        print(f"Form fields: {self.fields.keys()}")
+        self.fields['model'].choices = model_choices
+        self.fields['model'].initial = max_model if max_model in available_models else 'base'
     
     class Meta:
         model = Transcription
@@ -144,16 +158,8 @@ class AudioUploadForm(forms.ModelForm):
         if self.user and self.user.is_authenticated and self.user.is_superuser:
             return cleaned_data
             
-        # Get available models based on subscription for regular users
-        available_models = ['tiny', 'base']  # Default for non-authenticated users
-        if self.user and self.user.is_authenticated and hasattr(self.user, 'subscription'):
-            try:
-                available_models = self.user.subscription.plan.available_models
-            except Exception as e:
-                print(f"Error getting available models: {e}")
-        
-        # Check if selected model is available
-        if selected_model not in available_models:
+        # Check if selected model is available with the subscription found in __init__
+        if selected_model not in self.available_models:
             self.add_error('model', 'The selected model is not available with your current subscription.')
         
         return cleaned_data
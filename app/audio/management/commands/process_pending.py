@@ -1,21 +1,54 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from audio.models import Transcription
 from audio.tasks import process_audio_task
 
+
+def _process(transcription_id):
+    """Run the task in a worker thread and close the thread's DB connection"""
+    try:
+        process_audio_task(transcription_id)
+    finally:
+        connection.close()
+
+
 class Command(BaseCommand):
     help = 'Process pending transcriptions'
 
     def handle(self, *args, **options):
-        # Get all pending transcriptions
-        pending = Transcription.objects.filter(status='pending')
-        self.stdout.write(f'Found {pending.count()} pending transcriptions')
-        
-        # Process each pending transcription
-        for transcription in pending:
-            self.stdout.write(f'Processing transcription {transcription.id}...')
-            try:
-                # Call the task directly (synchronously for debugging)
-                process_audio_task(transcription.id)
-                self.stdout.write(self.style.SUCCESS(f'Successfully processed {transcription.id}'))
-            except Exception as e:
-                self.stderr.write(f'Error processing {transcription.id}: {str(e)}')
+        # Claim all pending transcriptions in one transaction, like
+        # batch_process_audio_task; rows locked by a concurrent claim are
+        # skipped so no transcription is processed twice. The task loads
+        # each row itself.
+        with transaction.atomic():
+            pending_ids = list(
+                Transcription.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(status=Transcription.STATUS_PENDING)
+                .values_list('id', flat=True)
+            )
+            Transcription.objects.filter(pk__in=pending_ids).update(status=Transcription.STATUS_PROCESSING)
+        self.stdout.write(f'Found {len(pending_ids)} pending transcriptions')
+
+        # Process transcriptions in threads so decoding and I/O for one file
+        # overlap with inference on another; the task itself only lets one
+        # thread load a model and run inference at a time. Threads are used
+        # rather than processes because CUDA contexts don't survive fork.
+        failed = 0
+        with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as executor:
+            futures = {
+                executor.submit(_process, transcription_id): transcription_id
+                for transcription_id in pending_ids
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Error processing {futures[future]}: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(pending_ids) - failed} of {len(pending_ids)} transcriptions'
+        ))
@@ -6,26 +6,31 @@ class Command(BaseCommand):
     help = 'Process pending media files and transcriptions'
 
     def handle(self, *args, **options):
-        # Process media files that haven't been extracted yet
-        pending_media = MediaFile.objects.filter(audio_extracted=False, is_video=True)
-        self.stdout.write(f'Found {pending_media.count()} media files to process')
+        # Process media files that haven't been extracted yet. Only the ids
+        # are needed: each task fetches its own row with every field it reads.
+        pending_media_ids = list(
+            MediaFile.objects.filter(audio_extracted=False, is_video=True).values_list('id', flat=True)
+        )
+        self.stdout.write(f'Found {len(pending_media_ids)} media files to process')
         
-        for media in pending_media:
-            self.stdout.write(f'Extracting audio from media {media.id}...')
+        for media_id in pending_media_ids:
+            self.stdout.write(f'Extracting audio from media {media_id}...')
             try:
-                extract_audio_task(media.id)
-                self.stdout.write(self.style.SUCCESS(f'Successfully extracted audio from {media.id}'))
+                extract_audio_task(media_id)
+                self.stdout.write(self.style.SUCCESS(f'Successfully extracted audio from {media_id}'))
             except Exception as e:
-                self.stderr.write(f'Error extracting audio from {media.id}: {str(e)}')
+                self.stderr.write(f'Error extracting audio from {media_id}: {str(e)}')
         
         # Now process pending transcriptions
-        pending_transcriptions = Transcription.objects.filter(status='pending')
-        self.stdout.write(f'Found {pending_transcriptions.count()} pending transcriptions')
+        pending_transcription_ids = list(
+            Transcription.objects.filter(status=Transcription.STATUS_PENDING).values_list('id', flat=True)
+        )
+        self.stdout.write(f'Found {len(pending_transcription_ids)} pending transcriptions')
         
-        for transcription in pending_transcriptions:
-            self.stdout.write(f'Processing transcription {transcription.id}...')
+        for transcription_id in pending_transcription_ids:
+            self.stdout.write(f'Processing transcription {transcription_id}...')
             try:
-                process_audio_task(transcription.id)
-                self.stdout.write(self.style.SUCCESS(f'Successfully processed transcription {transcription.id}'))
+                process_audio_task(transcription_id)
+                self.stdout.write(self.style.SUCCESS(f'Successfully processed transcription {transcription_id}'))
             except Exception as e:
-                self.stderr.write(f'Error processing transcription {transcription.id}: {str(e)}')
+                self.stderr.write(f'Error processing transcription {transcription_id}: {str(e)}')
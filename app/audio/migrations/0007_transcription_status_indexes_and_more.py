@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-15 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0006_mediafile_transcription_has_speaker_diarization_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transcription',
+            index=models.Index(fields=['status'], name='tr_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcription',
+            index=models.Index(fields=['status', '-created_at'], name='tr_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediafile',
+            index=models.Index(condition=models.Q(('audio_extracted', False), ('is_video', True)), fields=['created_at'], name='mf_pending_extract_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-15 23:20
+
+import auto_prefetch
+from django.conf import settings
+from django.db import migrations
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('audio', '0007_transcription_status_indexes_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='mediafile',
+            options={'base_manager_name': 'prefetch_manager', 'verbose_name': 'Media File', 'verbose_name_plural': 'Media Files'},
+        ),
+        migrations.AlterModelOptions(
+            name='transcription',
+            options={'base_manager_name': 'prefetch_manager', 'ordering': ['-created_at']},
+        ),
+        migrations.AlterModelManagers(
+            name='mediafile',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('prefetch_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterModelManagers(
+            name='transcription',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('prefetch_manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='mediafile',
+            name='transcription',
+            field=auto_prefetch.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='media_file', to='audio.transcription'),
+        ),
+        migrations.AlterField(
+            model_name='transcription',
+            name='user',
+            field=auto_prefetch.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transcriptions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
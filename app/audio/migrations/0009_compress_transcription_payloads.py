@@ -0,0 +1,76 @@
+# Generated by Django 4.2.23 on 2026-10-15 23:40
+
+import audio.fields
+from django.db import migrations, models
+
+PAYLOAD_FIELDS = ('speakers', 'speaker_segments', 'segments')
+
+
+def pack_payloads(apps, schema_editor):
+    Transcription = apps.get_model('audio', 'Transcription')
+    for transcription in Transcription.objects.only('pk', *PAYLOAD_FIELDS).iterator(chunk_size=500):
+        for name in PAYLOAD_FIELDS:
+            setattr(transcription, f'{name}_packed', getattr(transcription, name))
+        transcription.save(update_fields=[f'{name}_packed' for name in PAYLOAD_FIELDS])
+
+
+def unpack_payloads(apps, schema_editor):
+    Transcription = apps.get_model('audio', 'Transcription')
+    packed_fields = [f'{name}_packed' for name in PAYLOAD_FIELDS]
+    for transcription in Transcription.objects.only('pk', *packed_fields).iterator(chunk_size=500):
+        for name in PAYLOAD_FIELDS:
+            setattr(transcription, name, getattr(transcription, f'{name}_packed'))
+        transcription.save(update_fields=list(PAYLOAD_FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0008_alter_mediafile_options_alter_transcription_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='speakers_packed',
+            field=audio.fields.CompressedJSONField(blank=True, default=list, help_text='List of speakers with their display names and colors', null=True),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='speaker_segments_packed',
+            field=audio.fields.CompressedJSONField(blank=True, default=list, help_text='Segments with speaker information', null=True),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='segments_packed',
+            field=audio.fields.CompressedJSONField(blank=True, help_text='Detailed transcription segments with timestamps', null=True),
+        ),
+        migrations.RunPython(pack_payloads, unpack_payloads),
+        migrations.RemoveField(
+            model_name='transcription',
+            name='speakers',
+        ),
+        migrations.RemoveField(
+            model_name='transcription',
+            name='speaker_segments',
+        ),
+        migrations.RemoveField(
+            model_name='transcription',
+            name='segments',
+        ),
+        migrations.RenameField(
+            model_name='transcription',
+            old_name='speakers_packed',
+            new_name='speakers',
+        ),
+        migrations.RenameField(
+            model_name='transcription',
+            old_name='speaker_segments_packed',
+            new_name='speaker_segments',
+        ),
+        migrations.RenameField(
+            model_name='transcription',
+            old_name='segments_packed',
+            new_name='segments',
+        ),
+    ]
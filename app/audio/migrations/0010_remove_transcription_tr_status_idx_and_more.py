@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-15 23:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('audio', '0009_compress_transcription_payloads'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transcription',
+            name='tr_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transcription',
+            name='tr_status_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transcription',
+            index=models.Index(fields=['user', '-created_at'], name='tr_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcription',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='tr_pending_idx'),
+        ),
+    ]
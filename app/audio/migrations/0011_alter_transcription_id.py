@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-16 00:10
+
+from django.db import migrations, models
+import uuid6
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0010_remove_transcription_tr_status_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transcription',
+            name='id',
+            field=models.UUIDField(default=uuid6.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
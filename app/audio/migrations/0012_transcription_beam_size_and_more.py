@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-16 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio', '0011_alter_transcription_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='beam_size',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Beam size for decoding (1 for greedy)'),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='best_of',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Candidates sampled when decoding with a non-zero temperature'),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='need_word_timestamps',
+            field=models.BooleanField(default=False, help_text='Whether to compute word-level timestamps'),
+        ),
+    ]
@@ -1,67 +1,113 @@
 import os
-import uuid
+import json
+import time
 import logging
+import shutil
+import threading
 import subprocess
-from tempfile import NamedTemporaryFile
-from django.db import models
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+import auto_prefetch
+from uuid6 import uuid7
+from django.db import models, transaction
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from .fields import CompressedJSONField
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-class Transcription(models.Model):
-    # Status choices
-    STATUS_PENDING = 'pending'
-    STATUS_PROCESSING = 'processing'
-    STATUS_COMPLETED = 'completed'
-    STATUS_FAILED = 'failed'
-    
-    STATUS_CHOICES = [
-        (STATUS_PENDING, 'Pending'),
-        (STATUS_PROCESSING, 'Processing'),
-        (STATUS_COMPLETED, 'Completed'),
-        (STATUS_FAILED, 'Failed'),
-    ]
-    
-    # Whisper model choices (aligned with SubscriptionPlan)
-    WHISPER_TINY = 'tiny'
-    WHISPER_BASE = 'base'
-    WHISPER_SMALL = 'small'
-    WHISPER_MEDIUM = 'medium'
-    WHISPER_LARGE = 'large'
-    
-    MODEL_CHOICES = [
-        (WHISPER_TINY, 'Tiny (Fastest, lowest accuracy)'),
-        (WHISPER_BASE, 'Base (Fast, lower accuracy)'),
-        (WHISPER_SMALL, 'Small (Good balance)'),
-        (WHISPER_MEDIUM, 'Medium (Better accuracy)'),
-        (WHISPER_LARGE, 'Large (Best accuracy, slowest)'),
-    ]
+# Supported upload formats, in the order they are passed to the validator
+AUDIO_FORMATS = ('mp3', 'wav', 'm4a', 'ogg', 'flac', 'aac', 'wma', 'aiff')
+VIDEO_FORMATS = ('mp4', 'mov', 'avi', 'mkv', 'webm', 'flv', 'wmv', 'm4v', '3gp')
+
+# File extensions (with the dot) for fast membership checks
+AUDIO_EXTENSIONS = frozenset(f'.{fmt}' for fmt in AUDIO_FORMATS)
+VIDEO_EXTENSIONS = frozenset(f'.{fmt}' for fmt in VIDEO_FORMATS)
+
+# File extension -> media kind ('audio' or 'video') in a single lookup
+MEDIA_KINDS = {
+    **{ext: 'audio' for ext in AUDIO_EXTENSIONS},
+    **{ext: 'video' for ext in VIDEO_EXTENSIONS},
+}
+
+# Language code -> name, built once instead of on every lookup
+_LANGUAGE_NAMES = dict(settings.LANGUAGES)
+
+# Transcription statuses
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+STATUS_CHOICES = (
+    (STATUS_PENDING, 'Pending'),
+    (STATUS_PROCESSING, 'Processing'),
+    (STATUS_COMPLETED, 'Completed'),
+    (STATUS_FAILED, 'Failed'),
+)
+
+# Whisper model choices (aligned with SubscriptionPlan)
+WHISPER_TINY = 'tiny'
+WHISPER_BASE = 'base'
+WHISPER_SMALL = 'small'
+WHISPER_MEDIUM = 'medium'
+WHISPER_LARGE = 'large'
+
+MODEL_CHOICES = (
+    (WHISPER_TINY, 'Tiny (Fastest, lowest accuracy)'),
+    (WHISPER_BASE, 'Base (Fast, lower accuracy)'),
+    (WHISPER_SMALL, 'Small (Good balance)'),
+    (WHISPER_MEDIUM, 'Medium (Better accuracy)'),
+    (WHISPER_LARGE, 'Large (Best accuracy, slowest)'),
+)
+
+# Model size to display name mapping
+MODEL_DISPLAY_NAMES = MappingProxyType({
+    WHISPER_TINY: 'Tiny (Fastest)',
+    WHISPER_BASE: 'Base (Fast)',
+    WHISPER_SMALL: 'Small (Balanced)',
+    WHISPER_MEDIUM: 'Medium (Better)',
+    WHISPER_LARGE: 'Large (Best)',
+})
+
+# Model size to required subscription level (for reference)
+MODEL_REQUIREMENTS = MappingProxyType({
+    WHISPER_TINY: 'free',
+    WHISPER_BASE: 'free',
+    WHISPER_SMALL: 'basic',
+    WHISPER_MEDIUM: 'pro',
+    WHISPER_LARGE: 'enterprise',
+})
+
+class Transcription(auto_prefetch.Model):
+    # Class aliases of the module-level constants, kept for existing callers
+    STATUS_PENDING = STATUS_PENDING
+    STATUS_PROCESSING = STATUS_PROCESSING
+    STATUS_COMPLETED = STATUS_COMPLETED
+    STATUS_FAILED = STATUS_FAILED
+    STATUS_CHOICES = STATUS_CHOICES
     
-    # Model size to display name mapping
-    MODEL_DISPLAY_NAMES = {
-        WHISPER_TINY: 'Tiny (Fastest)',
-        WHISPER_BASE: 'Base (Fast)',
-        WHISPER_SMALL: 'Small (Balanced)',
-        WHISPER_MEDIUM: 'Medium (Better)',
-        WHISPER_LARGE: 'Large (Best)',
-    }
+    WHISPER_TINY = WHISPER_TINY
+    WHISPER_BASE = WHISPER_BASE
+    WHISPER_SMALL = WHISPER_SMALL
+    WHISPER_MEDIUM = WHISPER_MEDIUM
+    WHISPER_LARGE = WHISPER_LARGE
+    MODEL_CHOICES = MODEL_CHOICES
+    MODEL_DISPLAY_NAMES = MODEL_DISPLAY_NAMES
+    MODEL_REQUIREMENTS = MODEL_REQUIREMENTS
     
-    # Model size to required subscription level (for reference)
-    MODEL_REQUIREMENTS = {
-        WHISPER_TINY: 'free',
-        WHISPER_BASE: 'free',
-        WHISPER_SMALL: 'basic',
-        WHISPER_MEDIUM: 'pro',
-        WHISPER_LARGE: 'enterprise',
-    }
+    # Large per-segment data that list views don't need to load
+    PAYLOAD_FIELDS = ('speakers', 'speaker_segments', 'segments')
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transcriptions')
+    # Time-ordered UUIDv7 keys keep primary key index inserts at the right edge
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    user = auto_prefetch.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transcriptions')
     title = models.CharField(max_length=255, blank=True)
     
     # Transcription status and content
@@ -71,13 +117,13 @@ class Transcription(models.Model):
     
     # Speaker diarization
     has_speaker_diarization = models.BooleanField(default=False, help_text='Whether speaker diarization was performed')
-    speakers = models.JSONField(
+    speakers = CompressedJSONField(
         null=True, 
         blank=True, 
         help_text='List of speakers with their display names and colors',
         default=list
     )
-    speaker_segments = models.JSONField(
+    speaker_segments = CompressedJSONField(
         null=True, 
         blank=True, 
         help_text='Segments with speaker information',
@@ -90,7 +136,7 @@ class Transcription(models.Model):
     
     # Transcription details
     word_count = models.PositiveIntegerField(null=True, blank=True, help_text='Number of words in transcription')
-    segments = models.JSONField(null=True, blank=True, help_text='Detailed transcription segments with timestamps')
+    segments = CompressedJSONField(null=True, blank=True, help_text='Detailed transcription segments with timestamps')
     
     # Model information
     model_used = models.CharField(
@@ -100,20 +146,24 @@ class Transcription(models.Model):
         help_text='Whisper model used for transcription'
     )
     
+    # Decoding settings; the defaults (greedy, no word timestamps) are the cheapest
+    beam_size = models.PositiveSmallIntegerField(default=1, help_text='Beam size for decoding (1 for greedy)')
+    best_of = models.PositiveSmallIntegerField(default=1, help_text='Candidates sampled when decoding with a non-zero temperature')
+    need_word_timestamps = models.BooleanField(default=False, help_text='Whether to compute word-level timestamps')
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    @property
+    @cached_property
     def model_display_name(self):
         """Get the display name of the model used"""
-        return self.MODEL_DISPLAY_NAMES.get(self.model_used, self.model_used.capitalize())
+        return MODEL_DISPLAY_NAMES.get(self.model_used) or self.model_used.capitalize()
     
-    @property
+    @cached_property
     def detected_language(self):
         """Return the full language name if available"""
-        from django.conf import settings
-        return dict(settings.LANGUAGES).get(self.language, self.language)
+        return _LANGUAGE_NAMES.get(self.language, self.language)
     
     @property
     def duration_minutes(self):
@@ -124,8 +174,18 @@ class Transcription(models.Model):
         seconds = int(self.media_file.duration % 60)
         return f"{minutes}:{seconds:02d}"
     
-    class Meta:
+    class Meta(auto_prefetch.Model.Meta):
         ordering = ['-created_at']
+        indexes = [
+            # Per-user lists, newest first
+            models.Index(fields=['user', '-created_at'], name='tr_user_created_idx'),
+            # Queue scans only ever look for pending rows, oldest first
+            models.Index(
+                fields=['created_at'],
+                name='tr_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title or 'Untitled'} - {self.get_status_display()}"
@@ -133,18 +193,29 @@ class Transcription(models.Model):
     def process_audio(self):
         """
         Start the audio processing task asynchronously
+        
+        With batching enabled, pending transcriptions are picked up by the
+        periodic batch_process_audio_task instead.
         """
+        if settings.WHISPER_BATCH_SIZE > 1:
+            return
         from .tasks import process_audio_task
         process_audio_task.delay(str(self.id))
 
 
+@lru_cache(maxsize=1)
+def _upload_month(minute):
+    """Get the year/month upload directory, formatted once per minute"""
+    return timezone.now().strftime("%Y/%m")
+
+
 def get_media_upload_path(instance, filename):
     """
     Returns the upload path for media files (audio/video)
     Format: user_<user_id>/<file_type>/<year>/<month>/<filename>
     """
     file_type = 'videos' if instance.is_video else 'audio'
-    return f'user_{instance.transcription.user.id}/{file_type}/{timezone.now().strftime("%Y/%m")}/{filename}'
+    return f'user_{instance.transcription.user_id}/{file_type}/{_upload_month(int(time.time()) // 60)}/{filename}'
 
 
 def audio_file_path(instance, filename):
@@ -152,25 +223,85 @@ def audio_file_path(instance, filename):
     Returns the upload path for audio files
     Format: user_<user_id>/audio/<year>/<month>/<filename>
     """
-    return f'user_{instance.user.id}/audio/{timezone.now().strftime("%Y/%m")}/{filename}'
+    return f'user_{instance.user_id}/audio/{_upload_month(int(time.time()) // 60)}/{filename}'
+
+
+# ffmpeg binaries, resolved once rather than searched for in PATH on every run
+FFMPEG_BIN = shutil.which('ffmpeg') or 'ffmpeg'
+FFPROBE_BIN = shutil.which('ffprobe') or 'ffprobe'
+
+# Number of ffmpeg stderr lines kept for error reporting
+FFMPEG_STDERR_LINES = 200
+
+# Size of the ffmpeg stdout pipe buffer and of each chunk written to storage
+FFMPEG_CHUNK_SIZE = 1 << 20
+
+
+def _drain_stderr(stream, lines):
+    """Read a subprocess's stderr until EOF, keeping only the last lines"""
+    for line in iter(stream.readline, b''):
+        lines.append(line)
+    stream.close()
+
+
+def _feed_stdin(field_file, stdin):
+    """Copy a stored file into a subprocess's stdin, then close it"""
+    try:
+        with field_file.open('rb') as source:
+            shutil.copyfileobj(source, stdin, FFMPEG_CHUNK_SIZE)
+    except BrokenPipeError:
+        # The subprocess exited early; its exit status reports why
+        pass
+    except Exception as e:
+        logger.error(f"Error streaming {field_file.name} to ffmpeg: {e}")
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def probe_media(path):
+    """
+    Read container and stream metadata with a single ffprobe call
+    Returns a dict with the 'format' entries and the first 'audio' and
+    'video' stream entries (empty dicts when missing or probing failed)
+    """
+    cmd = [
+        FFPROBE_BIN,
+        '-v', 'error',
+        '-show_entries',
+        'format=format_name,duration,bit_rate:stream=codec_type,codec_name,sample_rate,channels,bit_rate,width,height,avg_frame_rate',
+        '-of', 'json',
+        path
+    ]
+    probe = {'format': {}, 'audio': {}, 'video': {}}
+    try:
+        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        data = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, ValueError, OSError) as e:
+        logger.warning(f"Could not probe media file {path}: {e}")
+        return probe
+    
+    probe['format'] = data.get('format') or {}
+    for stream in data.get('streams') or []:
+        codec_type = stream.get('codec_type')
+        if codec_type in ('audio', 'video') and not probe[codec_type]:
+            probe[codec_type] = stream
+    return probe
 
 
-class MediaFile(models.Model):
+class MediaFile(auto_prefetch.Model):
     """
     Model to store both audio and video files for a transcription
     """
-    transcription = models.OneToOneField(Transcription, on_delete=models.CASCADE, related_name='media_file')
+    transcription = auto_prefetch.OneToOneField(Transcription, on_delete=models.CASCADE, related_name='media_file')
     
     # Original file (video or audio)
     original_file = models.FileField(
         upload_to=get_media_upload_path,
         validators=[
-            FileExtensionValidator(allowed_extensions=[
-                # Audio formats
-                'mp3', 'wav', 'm4a', 'ogg', 'flac', 'aac', 'wma', 'aiff',
-                # Video formats
-                'mp4', 'mov', 'avi', 'mkv', 'webm', 'flv', 'wmv', 'm4v', '3gp'
-            ])
+            FileExtensionValidator(allowed_extensions=[*AUDIO_FORMATS, *VIDEO_FORMATS])
         ],
         help_text="Original uploaded file (video or audio)"
     )
@@ -203,23 +334,89 @@ class MediaFile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    class Meta:
+    class Meta(auto_prefetch.Model.Meta):
         verbose_name = 'Media File'
         verbose_name_plural = 'Media Files'
+        indexes = [
+            # Videos still waiting for audio extraction
+            models.Index(
+                fields=['created_at'],
+                name='mf_pending_extract_idx',
+                condition=models.Q(is_video=True, audio_extracted=False),
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         # Set is_video based on file extension if original_file exists
         if self.original_file:
             ext = os.path.splitext(self.original_file.name)[1].lower()
-            self.is_video = ext in ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v', '.3gp']
+            self.is_video = ext in VIDEO_EXTENSIONS
         
-        super().save(*args, **kwargs)
+        transcription_cached = MediaFile.transcription.is_cached(self)
+        update_fields = kwargs.get('update_fields')
         
-        # Set the transcription title to the filename if not set
-        if not self.transcription.title and self.original_file:
-            self.transcription.title = os.path.splitext(os.path.basename(self.original_file.name))[0]
-            self.transcription.save(update_fields=['title'])
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            # Partial saves that don't write the original file can't change
+            # the default title
+            if update_fields is not None and 'original_file' not in update_fields:
+                return
             
+            # Set the transcription title to the filename if not set. The
+            # empty-title condition lives in the UPDATE itself, so there is
+            # no read and a user-set title is never overwritten.
+            if self.original_file and not (transcription_cached and self.transcription.title):
+                title = os.path.splitext(os.path.basename(self.original_file.name))[0]
+                updated = Transcription.objects.filter(pk=self.transcription_id, title='').update(title=title)
+                if updated and transcription_cached:
+                    self.transcription.title = title
+            
+    def _apply_probe(self, probe):
+        """Copy metadata from a probe_media() result onto the model fields"""
+        media_format, audio, video = probe['format'], probe['audio'], probe['video']
+        
+        if media_format.get('duration'):
+            self.duration = float(media_format['duration'])
+        if audio.get('sample_rate'):
+            self.sample_rate = int(audio['sample_rate'])
+        if audio.get('channels'):
+            self.channels = int(audio['channels'])
+        bit_rate = audio.get('bit_rate') or media_format.get('bit_rate')
+        if bit_rate:
+            self.bitrate = int(bit_rate) // 1000
+        
+        if video.get('codec_name'):
+            self.video_codec = video['codec_name'][:50]
+        if video.get('width') and video.get('height'):
+            self.video_resolution = f"{video['width']}x{video['height']}"
+        # avg_frame_rate is a fraction like "30000/1001"
+        num, _, den = (video.get('avg_frame_rate') or '').partition('/')
+        if num.isdigit() and den.isdigit() and int(den):
+            self.frame_rate = round(int(num) / int(den), 3)
+    
+    def _ffmpeg_source(self):
+        """
+        Get the input ffmpeg should read the original file from
+        Returns (path, URL or 'pipe:0', extra ffmpeg input options). Remote
+        storages have no local path; ffmpeg streams those from their
+        (signed) URL, or from stdin when the storage can't serve URLs,
+        instead of the file being downloaded first.
+        """
+        try:
+            return self.original_file.path, []
+        except NotImplementedError:
+            pass
+        
+        try:
+            return self.original_file.url, [
+                '-reconnect', '1',
+                '-reconnect_streamed', '1',
+                '-reconnect_delay_max', '5',
+            ]
+        except NotImplementedError:
+            return 'pipe:0', []
+    
     def extract_audio_from_video(self):
         """
         Extract audio from video file and save as extracted_audio
@@ -229,50 +426,95 @@ class MediaFile(models.Model):
             return False
             
         try:
-            # Create a temporary file for the extracted audio
-            with NamedTemporaryFile(suffix='.wav', delete=False) as temp_audio:
-                temp_path = temp_audio.name
+            # Probe the file once and keep its metadata on the model
+            source, input_args = self._ffmpeg_source()
+            from_stdin = source == 'pipe:0'
+            if from_stdin:
+                # Probing would need a second pass over the stream
+                probe = {'format': {}, 'audio': {}, 'video': {}}
+            else:
+                probe = probe_media(source)
+            self._apply_probe(probe)
+            stream = probe['audio']
+            
+            # Audio that is already 16kHz mono PCM is copied without re-encoding
+            if (stream.get('codec_name') == 'pcm_s16le'
+                    and self.sample_rate == 16000 and self.channels == 1):
+                codec_args = ['-c:a', 'copy']
+            else:
+                codec_args = [
+                    '-acodec', 'pcm_s16le',    # Audio codec
+                    '-ar', '16000',            # Sample rate
+                    '-ac', '1',                # Mono audio
+                ]
             
-            # Use ffmpeg to extract audio
+            # Use ffmpeg to extract audio, writing the WAV to stdout
             cmd = [
-                'ffmpeg',
-                '-i', self.original_file.path,  # Input file
+                FFMPEG_BIN,
+                '-nostdin',                    # Never wait for console input
+                '-hide_banner',
+                '-loglevel', 'error',          # Only log errors to stderr
+                *input_args,
+                '-i', source,                  # Input file or URL
+                '-threads', '0',               # Let ffmpeg pick the thread count
                 '-vn',                         # Disable video
-                '-acodec', 'pcm_s16le',        # Audio codec
-                '-ar', '16000',                # Sample rate
-                '-ac', '1',                    # Mono audio
-                '-y',                          # Overwrite output file if it exists
-                temp_path                      # Output file
+                *codec_args,
+                '-f', 'wav',                   # Output format
+                'pipe:1'                       # Output to stdout
             ]
             
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if from_stdin else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=FFMPEG_CHUNK_SIZE
+            )
+            
+            # Feed the stored file to ffmpeg while it decodes
+            if from_stdin:
+                threading.Thread(
+                    target=_feed_stdin, args=(self.original_file, proc.stdin), daemon=True
+                ).start()
+            
+            # Drain stderr in the background so ffmpeg never blocks on a full
+            # pipe while we are reading stdout
+            stderr_lines = deque(maxlen=FFMPEG_STDERR_LINES)
+            stderr_thread = threading.Thread(
+                target=_drain_stderr, args=(proc.stderr, stderr_lines), daemon=True
+            )
+            stderr_thread.start()
+            
+            # Stream the extracted audio straight into storage
+            filename = f"{os.path.splitext(os.path.basename(self.original_file.name))[0]}.wav"
             try:
-                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                # Save the extracted audio to the model
-                with open(temp_path, 'rb') as audio_file:
-                    filename = f"{os.path.splitext(os.path.basename(self.original_file.name))[0]}.wav"
-                    self.extracted_audio.save(filename, ContentFile(audio_file.read()), save=False)
-                
-                self.audio_extracted = True
-                self.save()
-                return True
-                
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error extracting audio from video: {e}")
-                logger.error(f"FFmpeg stderr: {e.stderr.decode()}")
+                audio = File(proc.stdout, name=filename)
+                audio.DEFAULT_CHUNK_SIZE = FFMPEG_CHUNK_SIZE
+                self.extracted_audio.save(filename, audio, save=False)
+            finally:
+                proc.stdout.close()
+                returncode = proc.wait()
+                stderr_thread.join()
+            
+            if returncode != 0:
+                logger.error(f"Error extracting audio from video: ffmpeg exited with status {returncode}")
+                logger.error(f"FFmpeg stderr: {b''.join(stderr_lines).decode(errors='replace')}")
+                # Don't keep a truncated file
+                self.extracted_audio.delete(save=False)
                 return False
+            
+            self.audio_extracted = True
+            self.save(update_fields=[
+                'extracted_audio', 'audio_extracted',
+                'duration', 'sample_rate', 'channels', 'bitrate',
+                'video_codec', 'video_resolution', 'frame_rate',
+                'updated_at',
+            ])
+            return True
                 
         except Exception as e:
             logger.error(f"Error in extract_audio_from_video: {e}")
             return False
-            
-        finally:
-            # Clean up temporary file if it exists
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except Exception as e:
-                    logger.error(f"Error cleaning up temp file {temp_path}: {e}")
     
     def get_audio_file(self):
         """
@@ -283,21 +525,5 @@ class MediaFile(models.Model):
             return self.extracted_audio
         return self.original_file
     
-    def delete(self, *args, **kwargs):
-        """Delete associated files when the model is deleted"""
-        # Delete original file
-        if self.original_file:
-            storage, path = self.original_file.storage, self.original_file.path
-            if storage.exists(path):
-                storage.delete(path)
-        
-        # Delete extracted audio if it exists
-        if self.extracted_audio:
-            storage, path = self.extracted_audio.storage, self.extracted_audio.path
-            if storage.exists(path):
-                storage.delete(path)
-        
-        super().delete(*args, **kwargs)
-    
     def __str__(self):
-        return f"Media file for {self.transcription}"
+        return f"Media file for transcription {self.transcription_id}"
@@ -0,0 +1,89 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import MediaFile
+
+logger = logging.getLogger(__name__)
+
+# S3 DeleteObjects accepts at most this many keys per request
+MAX_DELETE_KEYS = 1000
+
+
+def _delete_files(storage, names):
+    """Delete files from a storage, batching the keys into DeleteObjects calls for S3 storages"""
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is not None and hasattr(storage, '_normalize_name'):
+        # django-storages S3 backend: one DeleteObjects call per 1000 keys
+        for i in range(0, len(names), MAX_DELETE_KEYS):
+            chunk = names[i:i + MAX_DELETE_KEYS]
+            try:
+                bucket.delete_objects(Delete={
+                    'Objects': [{'Key': storage._normalize_name(name)} for name in chunk]
+                })
+            except Exception as e:
+                logger.error(f"Error deleting media files {chunk}: {e}")
+        return
+
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.error(f"Error deleting media file {name}: {e}")
+
+
+class _PendingDeletes:
+    """Files to delete once a transaction commits, grouped by storage"""
+
+    def __init__(self):
+        self.names_by_storage = {}
+
+    def add(self, storage, names):
+        self.names_by_storage.setdefault(storage, []).extend(names)
+
+    def __call__(self):
+        for storage, names in self.names_by_storage.items():
+            _delete_files(storage, names)
+
+
+def _pending_deletes(connection):
+    """
+    Get the batch of deletes registered for the current transaction state,
+    registering a new one on first use
+
+    Batches are matched on the open savepoints, like Django's own on_commit
+    hooks: rolling back a savepoint discards the batch registered inside it,
+    so files of rows whose deletion was rolled back are kept.
+    """
+    savepoints = set(connection.savepoint_ids)
+    for hook_savepoints, func, *_ in connection.run_on_commit:
+        if isinstance(func, _PendingDeletes) and hook_savepoints == savepoints:
+            return func
+    batch = _PendingDeletes()
+    transaction.on_commit(batch, using=connection.alias)
+    return batch
+
+
+@receiver(post_delete, sender=MediaFile)
+def delete_media_files(sender, instance, using, **kwargs):
+    """
+    Remove stored files once the row deletion commits. This also covers
+    queryset deletes and cascades from Transcription, which never call
+    MediaFile.delete(); all files deleted in one transaction are removed
+    together.
+    """
+    names = [
+        field_file.name
+        for field_file in (instance.original_file, instance.extracted_audio)
+        if field_file
+    ]
+    if not names:
+        return
+
+    storage = instance.original_file.storage
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        # Autocommit: the deletion is already committed
+        _delete_files(storage, names)
+        return
+    _pending_deletes(connection).add(storage, names)
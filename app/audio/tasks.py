@@ -4,39 +4,39 @@ import time
 import logging
 import subprocess
 import tempfile
+import threading
 import shutil
+import functools
 import os.path
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import json
+import numpy as np
+import soundfile as sf
 from pathlib import Path
 from celery import shared_task, chain
 from celery.utils.log import get_task_logger
 from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import OperationalError
 from django.utils import timezone
 from pydub import AudioSegment
 
+from .attention import configure_attention, use_fused_encoder_attention
+from .buffers import SAMPLE_RATE, buffers_allocated, stage_audio, stage_batch
+
 # Initialize logger at module level
 logger = get_task_logger(__name__)
 
 # Import diarization module
 try:
-    from .diarization import SpeakerDiarizer, merge_transcription_with_diarization
-    DIARIZATION_AVAILABLE = True
+    from .diarization import DIARIZATION_AVAILABLE, get_available_diarizer, merge_transcription_with_diarization
 except ImportError as e:
     logger.warning(f"Failed to import diarization module: {e}")
     DIARIZATION_AVAILABLE = False
 
-# Initialize diarizer
-diarizer = None
-if DIARIZATION_AVAILABLE:
-    try:
-        diarizer = SpeakerDiarizer()
-        if not diarizer.is_available():
-            logger.warning("Speaker diarization is not available")
-            DIARIZATION_AVAILABLE = False
-    except Exception as e:
-        logger.error(f"Failed to initialize speaker diarizer: {e}")
-        DIARIZATION_AVAILABLE = False
+# The diarizer itself is loaded on first use in the process that runs it;
+# loading it here would initialize CUDA in prefork parents and web workers
 
 # Make psutil and humanize optional
 try:
@@ -79,32 +79,129 @@ logger = get_task_logger(__name__)
 # Using local imports within functions to avoid circular imports
 # and importing at runtime when needed
 
+# Prefer faster-whisper (CTranslate2 with quantized weights) and fall back
+# to the reference openai-whisper implementation
+try:
+    from faster_whisper import WhisperModel
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"faster-whisper not available, falling back to openai-whisper: {e}")
+    FASTER_WHISPER_AVAILABLE = False
+
 # Import whisper after setting up logging to catch any import errors
 try:
     import whisper
-    WHISPER_AVAILABLE = True
+    OPENAI_WHISPER_AVAILABLE = True
 except ImportError as e:
     logger.error(f"Failed to import Whisper: {e}")
-    WHISPER_AVAILABLE = False
+    OPENAI_WHISPER_AVAILABLE = False
+
+# whisper.cpp bindings, an opt-in CPU backend running GGML quantized weights
+try:
+    from pywhispercpp.model import Model as WhisperCppModel
+    WHISPER_CPP_AVAILABLE = True
+except ImportError:
+    WHISPER_CPP_AVAILABLE = False
+
+WHISPER_AVAILABLE = FASTER_WHISPER_AVAILABLE or OPENAI_WHISPER_AVAILABLE or WHISPER_CPP_AVAILABLE
+
+# The PyTorch-only optimizations (input buffers, SDPA attention, batched
+# log-mel) apply to the reference implementation, which only runs when
+# faster-whisper isn't installed
+USES_OPENAI_WHISPER = OPENAI_WHISPER_AVAILABLE and not FASTER_WHISPER_AVAILABLE
+
+# GGML checkpoints used for each model tier with the whisper.cpp backend
+WHISPER_CPP_MODELS = {
+    'tiny': 'tiny-q5_1',
+    'base': 'base-q5_1',
+    'small': 'small-q5_1',
+    'medium': 'medium-q5_0',
+    'large': 'large-v2-q5_0',
+}
+
+def _use_whisper_cpp():
+    """whisper.cpp is only used when selected with WHISPER_BACKEND, and only on CPU"""
+    return (WHISPER_CPP_AVAILABLE and settings.WHISPER_BACKEND == 'cpp'
+            and not torch.cuda.is_available())
+
+# Let the FP32 matmuls that remain, such as the mel filterbank projection,
+# use TF32 tensor cores on Ampere and newer. This only sets a flag, so it
+# is safe before the prefork pool forks.
+torch.set_float32_matmul_precision('high')
+
+def _use_fp16():
+    """Half precision only pays off on GPUs with tensor cores (Volta and newer)"""
+    return torch.cuda.is_available() and torch.cuda.get_device_capability(0)[0] >= 7
+
+def _compute_type():
+    """Get the precision models are loaded and run with on this machine"""
+    if not FASTER_WHISPER_AVAILABLE:
+        return 'float16' if _use_fp16() else 'float32'
+    if not torch.cuda.is_available():
+        return 'int8'
+    # INT8 weights; activations in BF16 on Ampere and newer, which has the
+    # FP32 exponent range, otherwise FP16 where it is fast
+    major = torch.cuda.get_device_capability(0)[0]
+    if major >= 8:
+        return 'int8_bfloat16'
+    return 'int8_float16' if major >= 7 else 'int8_float32'
+
+def _compile_encoder(model):
+    """Compile an openai-whisper encoder with torch.compile on the GPU"""
+    # torch.compile only exists on PyTorch 2.x; CUDA graphs need a GPU
+    if not hasattr(torch, 'compile') or not torch.cuda.is_available():
+        return
+    
+    # The encoder always sees a padded 80x3000 mel, so one graph covers
+    # every call. The decoder is left in eager mode: its key/value cache is
+    # filled by forward hooks and its input length changes every step.
+    try:
+        model.encoder = torch.compile(model.encoder, mode='reduce-overhead')
+        logger.info("Compiled Whisper encoder")
+    except Exception as e:
+        logger.warning(f"Failed to compile Whisper encoder, using eager mode: {e}")
 
 def _load_whisper_model(model_name='base'):
     """Load Whisper model with memory optimizations"""
     if not WHISPER_AVAILABLE:
-        raise ImportError("Whisper is not available. Please install it with 'pip install openai-whisper'")
+        raise ImportError("Whisper is not available. Please install it with 'pip install faster-whisper'")
     
     logger.info(f"Loading Whisper model: {model_name}")
     
-    # Set environment variables for PyTorch memory management
-    os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128'
+    if _use_whisper_cpp():
+        try:
+            return WhisperCppModel(
+                WHISPER_CPP_MODELS.get(model_name, model_name),
+                models_dir=WHISPER_CACHE_DIR,
+                n_threads=max(1, (os.cpu_count() or 2) // 2),
+            )
+        except Exception as e:
+            logger.error(f"Error loading whisper.cpp model {model_name}: {e}")
+            if model_name != 'base':
+                logger.info("Falling back to base model")
+                return _load_whisper_model('base')
+            raise
+    
+    if FASTER_WHISPER_AVAILABLE:
+        try:
+            return WhisperModel(
+                model_name,
+                device='cuda' if torch.cuda.is_available() else 'cpu',
+                compute_type=_compute_type(),
+                download_root=WHISPER_CACHE_DIR,
+                # CTranslate2 defaults to 4 threads; leave half the cores
+                # for ffmpeg decoding and the rest of the worker
+                cpu_threads=max(1, (os.cpu_count() or 2) // 2),
+            )
+        except Exception as e:
+            logger.error(f"Error loading Whisper model {model_name}: {e}")
+            if model_name != 'base':
+                logger.info("Falling back to base model")
+                return _load_whisper_model('base')
+            raise
     
     # Try to enable memory-efficient attention
-    try:
-        import xformers.ops
-        torch.backends.cuda.enable_flash_sdp(True)
-        torch.backends.cuda.enable_mem_efficient_sdp(True)
-        logger.info("Enabled memory-efficient attention with xFormers")
-    except ImportError:
-        logger.info("xFormers not available, using default attention")
+    configure_attention()
     
     try:
         # Load the model with specific optimizations
@@ -119,6 +216,9 @@ def _load_whisper_model(model_name='base'):
         model.eval()
         for param in model.parameters():
             param.requires_grad = False
+        
+        use_fused_encoder_attention(model)
+        _compile_encoder(model)
             
         return model
     except Exception as e:
@@ -130,8 +230,434 @@ def _load_whisper_model(model_name='base'):
         raise
 
 
+# Loaded Whisper models kept for the life of the worker process, keyed by
+# (model name, device, compute type)
+_MODEL_CACHE = {}
+
+
+def _model_cache_key(model_name):
+    return (model_name, 'cuda' if torch.cuda.is_available() else 'cpu', _compute_type())
+
+
+# English-only distilled checkpoints (CTranslate2 conversions for
+# faster-whisper) used in place of the larger tiers. They keep the full
+# encoder but only two decoder layers. tiny and base stay as they are:
+# the smallest distilled model is larger than both.
+DISTIL_MODELS = {
+    'small': 'Systran/faster-distil-whisper-small.en',
+    'medium': 'Systran/faster-distil-whisper-medium.en',
+    'large': 'Systran/faster-distil-whisper-large-v2',
+}
+
+
+def resolve_model_name(model_name, language=None):
+    """Get the checkpoint to load for a model tier, using a distilled one for English audio"""
+    if (FASTER_WHISPER_AVAILABLE and not _use_whisper_cpp() and settings.WHISPER_DISTIL_MODELS
+            and language == 'en' and model_name in DISTIL_MODELS):
+        return DISTIL_MODELS[model_name]
+    return model_name
+
+
+def get_whisper_model(model_name='base', language=None):
+    """Return a cached Whisper model, loading it on first use in this process"""
+    model_name = resolve_model_name(model_name, language)
+    key = _model_cache_key(model_name)
+    model = _MODEL_CACHE.get(key)
+    if model is None:
+        model = _MODEL_CACHE[key] = _load_whisper_model(model_name)
+    else:
+        _wake_model(model)
+    _mark_models_used()
+    return model
+
+
+# When the last cached model was used, and the timer that offloads idle
+# models from the GPU
+_models_last_used = 0.0
+_offload_timer = None
+
+
+def _mark_models_used():
+    global _models_last_used
+    _models_last_used = time.monotonic()
+
+
+def _offloadable(model):
+    """
+    Check if a model's weights can be moved off the GPU and back
+
+    Only faster-whisper models qualify: CTranslate2 can unload a model to
+    CPU memory and reload it, while the openai-whisper encoder is compiled
+    into CUDA graphs bound to its weights' device addresses.
+    """
+    return (FASTER_WHISPER_AVAILABLE and isinstance(model, WhisperModel)
+            and hasattr(model.model, 'unload_model'))
+
+
+def _wake_model(model):
+    """Move an offloaded model's weights back onto the GPU"""
+    if _offloadable(model) and not model.model.model_is_loaded:
+        model.model.load_model()
+        logger.info("Restored offloaded Whisper model to the GPU")
+
+
+def _offload_idle_models():
+    """Move cached models' weights to CPU memory if no task used them for a while"""
+    with _INFERENCE_LOCK:
+        if time.monotonic() - _models_last_used < settings.WHISPER_IDLE_OFFLOAD_SECONDS:
+            return
+        for model in _MODEL_CACHE.values():
+            if _offloadable(model) and model.model.model_is_loaded:
+                model.model.unload_model(to_cpu=True)
+                logger.info("Offloaded idle Whisper model to CPU memory")
+
+
+def schedule_model_offload():
+    """Offload the cached models once the worker has been idle for WHISPER_IDLE_OFFLOAD_SECONDS"""
+    global _offload_timer
+    delay = settings.WHISPER_IDLE_OFFLOAD_SECONDS
+    if not delay or not _MODEL_CACHE or not torch.cuda.is_available():
+        return
+    _mark_models_used()
+    if _offload_timer is not None:
+        _offload_timer.cancel()
+    _offload_timer = threading.Timer(delay, _offload_idle_models)
+    _offload_timer.daemon = True
+    _offload_timer.start()
+
+
+# Clips up to one Whisper window long can be decoded together in a batch
+BATCH_MAX_SECONDS = 30
+
+
+def _transcribe_batch(model, audios, options):
+    """
+    Transcribe clips of at most BATCH_MAX_SECONDS each
+
+    With openai-whisper the clips go through the encoder and decoder as a
+    single batch; faster-whisper has no batched API, so they run one after
+    another on the same model.
+
+    Args:
+        options: Decode options from transcription_options()
+
+    Returns:
+        A list of result dicts shaped like _transcribe()'s
+    """
+    if not (OPENAI_WHISPER_AVAILABLE and isinstance(model, whisper.Whisper)):
+        return [_transcribe(model, audio, options) for audio in audios]
+
+    # Padded clips go to the GPU in a single copy through the worker's
+    # pinned buffer when it is allocated and large enough
+    clips = stage_batch(audios, whisper.audio.N_SAMPLES) if buffers_allocated() else None
+    if clips is None:
+        clips = torch.from_numpy(np.stack([whisper.pad_or_trim(audio) for audio in audios])).to(model.device)
+    mels = _log_mel_batch(clips, model.dims.n_mels)
+    # Keep timestamp tokens so each clip splits into sentence-level segments
+    # for the diarization merge instead of one block of text. Like
+    # whisper.transcribe(), sample best_of candidates above zero temperature
+    # and run the beam search otherwise; decode() rejects both together.
+    temperature = options.get('temperature', 0.0)
+    decode_options = whisper.DecodingOptions(
+        task=options.get('task', 'transcribe'),
+        language=options.get('language'),
+        temperature=temperature,
+        best_of=options.get('best_of') if temperature > 0 else None,
+        beam_size=options.get('beam_size') if temperature == 0 else None,
+        patience=options.get('patience') if temperature == 0 else None,
+        length_penalty=options.get('length_penalty'),
+        suppress_tokens=options.get('suppress_tokens', '-1'),
+        fp16=options.get('fp16', _use_fp16()),
+    )
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    results = []
+    for audio, decoded in zip(audios, whisper.decode(model, mels, decode_options)):
+        duration = len(audio) / SAMPLE_RATE
+        results.append({
+            "text": decoded.text.strip(),
+            "language": decoded.language,
+            "duration": duration,
+            "segments": _split_at_timestamps(tokenizer, decoded.tokens, duration),
+        })
+    return results
+
+
+def _log_mel_batch(clips, n_mels):
+    """
+    Batched whisper.log_mel_spectrogram for equal-length clips
+
+    One STFT and one filterbank matmul cover the whole (batch, samples)
+    tensor instead of a call per clip; the dynamic range is still clamped
+    per clip, as the reference implementation does.
+    """
+    window = torch.hann_window(whisper.audio.N_FFT, device=clips.device)
+    stft = torch.stft(clips, whisper.audio.N_FFT, whisper.audio.HOP_LENGTH, window=window, return_complex=True)
+    magnitudes = stft[..., :-1].abs() ** 2
+    mel_spec = whisper.audio.mel_filters(clips.device, n_mels) @ magnitudes
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(1, 2), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+# Seconds per Whisper timestamp token
+TIMESTAMP_PRECISION = 0.02
+
+
+def _split_at_timestamps(tokenizer, tokens, duration):
+    """Split a decoded token sequence into segments at its timestamp tokens"""
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = min((token - tokenizer.timestamp_begin) * TIMESTAMP_PRECISION, duration)
+        if text_tokens:
+            text = tokenizer.decode(text_tokens).strip()
+            if text:
+                segments.append({"start": start, "end": time, "text": text})
+            text_tokens = []
+        start = time
+    # Text after the last timestamp runs to the end of the clip
+    if text_tokens:
+        text = tokenizer.decode(text_tokens).strip()
+        if text:
+            segments.append({"start": start, "end": duration, "text": text})
+    return segments
+
+
+def warm_up_whisper_model(model_name='base'):
+    """
+    Load a model into the cache and run it once on a second of silence, so
+    compilation and CUDA kernel set-up don't land on the first real task
+    """
+    with _INFERENCE_LOCK:
+        model = get_whisper_model(model_name)
+        _transcribe(model, np.zeros(SAMPLE_RATE, dtype=np.float32), {'fp16': _use_fp16()})
+
+
+def clear_model_cache():
+    """Drop all cached Whisper models and release their memory"""
+    _MODEL_CACHE.clear()
+    clear_memory()
+
+
+def _whisper_cpp_language(model):
+    """
+    Get the language whisper.cpp detected in its last run, or None
+
+    pywhispercpp doesn't expose it on Model, so it is read from the context
+    through the raw bindings; if those change, the language is left unset.
+    """
+    try:
+        import _pywhispercpp as pw
+        return pw.whisper_lang_str(pw.whisper_full_lang_id(model._ctx))
+    except Exception as e:
+        logger.warning(f"Could not read the language detected by whisper.cpp: {e}")
+        return None
+
+
+def _transcribe(model, audio, options):
+    """
+    Transcribe audio with either Whisper backend
+
+    Args:
+        audio: Path to an audio file, or 16kHz mono float32 samples
+
+    Returns:
+        dict with 'text', 'language', 'duration' and 'segments', with the
+        segments already in the stored shape: 'start', 'end' and stripped 'text'.
+        'language' is None if the backend couldn't report it.
+    """
+    if WHISPER_CPP_AVAILABLE and isinstance(model, WhisperCppModel):
+        if not isinstance(audio, np.ndarray):
+            audio = decode_audio(audio)
+        language = options.get('language')
+        # The model is built for greedy decoding without token timestamps
+        if options.get('beam_size', 1) > 1 or options.get('word_timestamps'):
+            logger.warning(
+                "whisper.cpp backend decodes greedily without word timestamps; "
+                f"ignoring beam_size={options.get('beam_size')}, word_timestamps={options.get('word_timestamps')}"
+            )
+        # Segment times are in centiseconds
+        segments = [
+            {"start": segment.t0 / 100, "end": segment.t1 / 100, "text": segment.text.strip()}
+            for segment in model.transcribe(audio, language=language or 'auto')
+        ]
+        return {
+            "text": " ".join(segment["text"] for segment in segments),
+            "language": language or _whisper_cpp_language(model),
+            "duration": len(audio) / SAMPLE_RATE,
+            "segments": segments,
+        }
+
+    if FASTER_WHISPER_AVAILABLE and isinstance(model, WhisperModel):
+        options = {key: value for key, value in options.items() if key != 'fp16'}
+        # Skip silences of half a second or more, not only the default 2s+
+        raw_segments, info = model.transcribe(
+            audio, vad_filter=True, vad_parameters={'min_silence_duration_ms': 500}, **options
+        )
+        # Segments are produced lazily while decoding
+        texts = []
+        segments = []
+        for segment in raw_segments:
+            texts.append(segment.text)
+            segments.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+        return {
+            "text": "".join(texts),
+            "language": info.language,
+            "duration": info.duration,
+            "segments": segments,
+        }
+
+    # Long recordings without word timestamps skip silence and decode their
+    # voiced chunks in encoder batches instead of one window after another
+    if (isinstance(audio, np.ndarray) and len(audio) > BATCH_MAX_SECONDS * SAMPLE_RATE
+            and not options.get('word_timestamps')):
+        result = _transcribe_voiced_chunks(model, audio, options)
+        if result is not None:
+            return result
+
+    # Reuse the worker's persistent input buffer when the audio fits
+    audio_input = stage_audio(audio) if buffers_allocated() else None
+    if audio_input is None:
+        audio_input = audio
+    result = model.transcribe(audio_input, **options)
+    # Keep only the stored fields; openai-whisper also returns tokens,
+    # log probabilities and (optionally) per-word data
+    segments = [
+        {"start": segment["start"], "end": segment["end"], "text": segment["text"].strip()}
+        for segment in result["segments"]
+    ]
+    return {
+        "text": result["text"],
+        "language": result["language"],
+        "duration": len(audio) / SAMPLE_RATE if isinstance(audio, np.ndarray) else (segments[-1]["end"] if segments else 0),
+        "segments": segments,
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def _load_vad():
+    """Load the Silero VAD model and its speech timestamp helper, or None if unavailable"""
+    try:
+        model, utils = torch.hub.load('snakers4/silero-vad', 'silero_vad', trust_repo=True)
+        return model, utils[0]
+    except Exception as e:
+        logger.warning(f"Silero VAD not available, transcribing long audio sequentially: {e}")
+        return None
+
+
+def _vad_chunks(audio):
+    """
+    Split audio into voiced chunks of at most BATCH_MAX_SECONDS
+
+    Returns:
+        A list of (start, end) sample offsets, or None if VAD is unavailable
+    """
+    vad = _load_vad()
+    if vad is None:
+        return None
+    vad_model, get_speech_timestamps = vad
+    
+    max_samples = BATCH_MAX_SECONDS * SAMPLE_RATE
+    chunks = []
+    for region in get_speech_timestamps(torch.from_numpy(audio), vad_model, sampling_rate=SAMPLE_RATE):
+        start, end = region['start'], region['end']
+        # Merge speech regions into the previous chunk while it fits a window
+        if chunks and end - chunks[-1][0] <= max_samples:
+            chunks[-1][1] = end
+            continue
+        while end - start > max_samples:
+            chunks.append([start, start + max_samples])
+            start += max_samples
+        chunks.append([start, end])
+    return chunks
+
+
+def _transcribe_voiced_chunks(model, audio, options):
+    """
+    Transcribe only the voiced parts of a long recording, batching the chunks
+    through the model and shifting their timestamps back into place
+
+    Returns:
+        A result dict shaped like _transcribe()'s, or None if VAD is unavailable
+    """
+    chunks = _vad_chunks(audio)
+    if chunks is None:
+        return None
+    
+    segments = []
+    detected_language = options.get('language')
+    batch_size = max(settings.WHISPER_BATCH_SIZE, 1)
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        results = _transcribe_batch(model, [audio[start:end] for start, end in batch], options)
+        for (start, _), result in zip(batch, results):
+            detected_language = detected_language or result["language"]
+            offset = start / SAMPLE_RATE
+            segments.extend(
+                {"start": offset + segment["start"], "end": offset + segment["end"], "text": segment["text"]}
+                for segment in result["segments"]
+            )
+    return {
+        "text": " ".join(segment["text"] for segment in segments),
+        # None when nothing was voiced; the stored language is then kept
+        "language": detected_language,
+        "duration": len(audio) / SAMPLE_RATE,
+        "segments": segments,
+    }
+
+
+def transcription_options(transcription):
+    """
+    Build the decode options for a transcription
+
+    Used by both the per-file and the batched path, so a transcription
+    decodes the same way whichever one picks it up.
+    """
+    options = {
+        'fp16': _use_fp16(),  # Also needed for flash attention
+        'task': 'transcribe',
+        # Any temperature above zero samples instead of running
+        # beam search, which would ignore beam_size entirely
+        'temperature': 0.0,
+        'best_of': transcription.best_of,
+        'beam_size': transcription.beam_size,
+        'patience': 1.0,
+        'length_penalty': 1.0,
+        # Don't feed each window's text into the next; avoids
+        # longer decoder prompts and repetition loops
+        'condition_on_previous_text': False,
+        'word_timestamps': transcription.need_word_timestamps,
+        'suppress_tokens': [-1],
+        'initial_prompt': None
+    }
+    
+    # Only set language if it's specified; otherwise it is auto-detected
+    language = transcription.language
+    if language and language != 'auto':
+        options['language'] = language
+    return options
+
+
+def count_words(segments):
+    """
+    Count the words in stripped transcription segments
+
+    Whisper separates words with single spaces, so counting spaces avoids
+    building a list of every word the way str.split() does.
+    """
+    return sum(segment["text"].count(' ') + 1 for segment in segments if segment["text"])
+
+
 def log_memory_usage(prefix=""):
-    """Log current memory usage"""
+    """Log current memory usage, and peak GPU memory since the last reset"""
+    # Skip the queries and size formatting when nobody will see them
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    
     # Log CPU memory if psutil is available
     if PSUTIL_AVAILABLE:
         try:
@@ -155,15 +681,20 @@ def log_memory_usage(prefix=""):
     # Log GPU memory if available
     if torch.cuda.is_available():
         try:
+            # cudaMalloc retries mean the allocator had to free cached blocks
+            # to satisfy a request, i.e. the cache is fragmented
+            alloc_retries = torch.cuda.memory_stats().get('num_alloc_retries', 0)
             if HUMANIZE_AVAILABLE:
                 logger.info(
-                    f"{prefix}GPU Memory - Allocated: {humanize.naturalsize(torch.cuda.memory_allocated())}, "
-                    f"Reserved: {humanize.naturalsize(torch.cuda.memory_reserved())}"
+                    f"{prefix}GPU Memory - Peak allocated: {humanize.naturalsize(torch.cuda.max_memory_allocated())}, "
+                    f"Reserved: {humanize.naturalsize(torch.cuda.memory_reserved())}, "
+                    f"Alloc retries: {alloc_retries}"
                 )
             else:
                 logger.info(
-                    f"{prefix}GPU Memory - Allocated: {torch.cuda.memory_allocated()} bytes, "
-                    f"Reserved: {torch.cuda.memory_reserved()} bytes"
+                    f"{prefix}GPU Memory - Peak allocated: {torch.cuda.max_memory_allocated()} bytes, "
+                    f"Reserved: {torch.cuda.memory_reserved()} bytes, "
+                    f"Alloc retries: {alloc_retries}"
                 )
         except Exception as e:
             logger.warning(f"Error getting GPU memory info: {e}")
@@ -173,59 +704,97 @@ def clear_memory():
     gc.collect()
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
-        torch.cuda.synchronize()
 
-# Supported audio and video formats
-AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.ogg', '.flac'}
-VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
-SUPPORTED_EXTENSIONS = AUDIO_EXTENSIONS.union(VIDEO_EXTENSIONS)
+# Errors that can go away on a retry: ffmpeg failures on partially written
+# or remote files, GPU memory pressure from other work, file system and
+# database hiccups. Anything else is a bad input or a bug and fails at once.
+TRANSIENT_ERRORS = (
+    subprocess.CalledProcessError,
+    torch.cuda.OutOfMemoryError,
+    OSError,
+    OperationalError,
+)
+
+# Serializes model loading and inference when several tasks run in threads
+# of the same process (e.g. the process_pending command)
+_INFERENCE_LOCK = threading.Lock()
+
+# Decodes media in the background while a task waits for the inference
+# lock and its model; ffmpeg runs in a subprocess, so the threads mostly
+# wait on its pipe
+_DECODE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='audio-decode')
+
+def decode_audio(input_path):
+    """
+    Decode an audio or video file to 16kHz mono float32 samples with ffmpeg
 
-def convert_to_wav(input_path, is_video=False):
-    """Convert audio/video file to WAV format using ffmpeg"""
-    logger.info(f"Converting {'video' if is_video else 'audio'} file to WAV format: {input_path}")
-    output_path = f"{os.path.splitext(input_path)[0]}.wav"
+    The PCM is read straight from ffmpeg's stdout, so no intermediate WAV
+    file is written.
+    """
+    from .models import FFMPEG_BIN
     
-    try:
-        # For video files, extract audio only
-        if is_video:
-            cmd = [
-                'ffmpeg',
-                '-i', input_path,    # Input file
-                '-vn',               # Disable video
-                '-acodec', 'pcm_s16le',  # PCM 16-bit
-                '-ar', '16000',      # 16kHz sample rate
-                '-ac', '1',          # Mono audio
-                '-y',                # Overwrite output file
-                output_path
-            ]
-        else:
-            # For audio files, just convert to WAV
-            cmd = [
-                'ffmpeg',
-                '-i', input_path,
-                '-ar', '16000',  # 16kHz sample rate
-                '-ac', '1',       # Mono audio
-                '-y',             # Overwrite output file
-                output_path
-            ]
-            
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        logger.info(f"Successfully converted to {output_path}")
-        return output_path
-    except subprocess.CalledProcessError as e:
-        error_msg = f"Error converting file: {e.stderr}"
-        logger.error(error_msg)
-        raise Exception(f"Failed to convert file: {str(e)}")
-    except Exception as e:
-        error_msg = f"Unexpected error during conversion: {str(e)}"
-        logger.error(error_msg)
-        raise
+    logger.info(f"Decoding audio with ffmpeg: {input_path}")
+    cmd = [
+        FFMPEG_BIN,
+        '-nostdin',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-i', input_path,
+        '-vn',                    # Skip any video stream
+        '-f', 'f32le',            # Raw float32 little-endian samples
+        '-acodec', 'pcm_f32le',
+        '-ac', '1',               # Mono audio
+        '-ar', str(SAMPLE_RATE),  # 16kHz sample rate
+        '-'
+    ]
+    # stdout is the only pipe, so it can be drained in one large read
+    # instead of subprocess.run's select loop over 32KB chunks; stderr goes
+    # to a temporary file so it can't fill up and stall ffmpeg
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, bufsize=1 << 20)
+        with process.stdout:
+            raw = process.stdout.read()
+        if process.wait() != 0:
+            stderr.seek(0)
+            error_output = stderr.read()
+            logger.error(f"Error decoding file: {error_output.decode(errors='replace')}")
+            # A transient error, so tasks retry it
+            raise subprocess.CalledProcessError(process.returncode, cmd, stderr=error_output)
+    return np.frombuffer(raw, np.float32)
+
+# PCM codecs libsndfile can read without going through ffmpeg
+DIRECT_READ_CODECS = frozenset({'pcm_s16le', 'pcm_f32le'})
+
+def media_audio_path(media_file):
+    """Get the local path of the audio to transcribe: the extracted audio for videos, else the upload"""
+    return os.path.join(settings.MEDIA_ROOT, str(media_file.get_audio_file()))
+
+def load_audio_samples(input_path, probe):
+    """
+    Get 16kHz mono float32 samples for a media file
+
+    WAV files that are already 16kHz mono PCM (such as the audio extracted
+    from uploaded videos) are read directly with soundfile; everything else
+    is decoded with ffmpeg.
+    """
+    stream = probe['audio']
+    if (probe['format'].get('format_name') == 'wav'
+            and stream.get('codec_name') in DIRECT_READ_CODECS
+            and int(stream.get('sample_rate') or 0) == SAMPLE_RATE
+            and int(stream.get('channels') or 0) == 1):
+        try:
+            samples, _ = sf.read(input_path, dtype='float32')
+            return samples
+        except Exception as e:
+            logger.warning(f"Could not read {input_path} directly, decoding with ffmpeg: {e}")
+    return decode_audio(input_path)
 
 @shared_task(
     bind=True,
     max_retries=3,
     name='audio.tasks.extract_audio_task',
-    autoretry_for=(Exception,),
+    autoretry_for=TRANSIENT_ERRORS,
+    throws=(ValueError, ObjectDoesNotExist),
     retry_backoff=60,  # Wait 60s before first retry
     retry_backoff_max=300,  # Max 5 minutes between retries
     retry_jitter=True,  # Add jitter to avoid thundering herd
@@ -260,10 +829,8 @@ def extract_audio_task(self, media_file_id):
             # Update transcription status if needed
             transcription = media_file.transcription
             if transcription.status == Transcription.STATUS_PENDING:
-                transcription.status = Transcription.STATUS_PROCESSING
-                transcription.save(update_fields=['status'])
-                
-                # Start the actual transcription process
+                # Start the actual transcription process; the row stays
+                # pending so the batch task can claim it
                 transcription.process_audio()
         else:
             logger.error(f"Failed to extract audio from video {media_file_id}")
@@ -277,15 +844,16 @@ def extract_audio_task(self, media_file_id):
         raise
     except Exception as e:
         logger.error(f"Error in extract_audio_task for media file {media_file_id}: {str(e)}", exc_info=True)
-        # Retry the task with exponential backoff
-        raise self.retry(exc=e, countdown=60 * self.request.retries)
+        # autoretry_for retries TRANSIENT_ERRORS with backoff
+        raise
 
 
 @shared_task(
     bind=True,
     max_retries=3,
     name='audio.tasks.process_audio_task',
-    autoretry_for=(Exception,),
+    autoretry_for=TRANSIENT_ERRORS,
+    throws=(ValueError, ObjectDoesNotExist),
     retry_backoff=60,  # Wait 60s before first retry
     retry_backoff_max=300,  # Max 5 minutes between retries
     retry_jitter=True,  # Add jitter to avoid thundering herd
@@ -302,19 +870,15 @@ def process_audio_task(self, transcription_id):
     logger.info(f"Starting processing for transcription ID: {transcription_id}")
     
     # Import models here to avoid circular imports
-    from .models import Transcription
-    
-    temp_files = []  # To keep track of temporary files for cleanup
+    from .models import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, Transcription, probe_media
     
     try:
-        transcription = Transcription.objects.select_related('media_file').get(pk=transcription_id)
-        
-        # If this is a video, make sure audio has been extracted
-        if hasattr(transcription, 'media_file') and transcription.media_file and transcription.media_file.is_video:
-            if not transcription.media_file.audio_extracted:
-                logger.error(f"Audio not yet extracted from video for transcription {transcription_id}")
-                # Try again in 10 seconds
-                raise self.retry(countdown=10)
+        # The stored payloads are only ever written here, never read
+        transcription = (
+            Transcription.objects.select_related('media_file')
+            .defer('text', *Transcription.PAYLOAD_FIELDS)
+            .get(pk=transcription_id)
+        )
     except Transcription.DoesNotExist:
         logger.error(f"Transcription {transcription_id} not found")
         return
@@ -325,77 +889,81 @@ def process_audio_task(self, transcription_id):
             logger.error(f"Audio not yet extracted from video for transcription {transcription_id}")
             # Try again in 10 seconds
             raise self.retry(countdown=10)
-        # Update status to processing
-        transcription.status = Transcription.STATUS_PROCESSING
+    
+    # Update status to processing
+    transcription.status = Transcription.STATUS_PROCESSING
+    Transcription.objects.filter(pk=transcription.pk).update(status=Transcription.STATUS_PROCESSING)
+    
+    # Get the associated media file (audio or video)
+    try:
+        media_file = transcription.media_file
+        logger.info(f"Found media file: {media_file.original_file.name}")
+    except Exception as e:
+        error_msg = f"Error accessing media file for transcription {transcription.id}: {str(e)}"
+        logger.error(error_msg)
+        transcription.status = Transcription.STATUS_FAILED
+        transcription.text = error_msg
+        transcription.save(update_fields=['status', 'text'])
+        return {"status": "error", "message": error_msg}
+    
+    # Get the full path to the audio (the extracted audio for videos)
+    media_path = media_audio_path(media_file)
+    logger.info(f"Media file path: {media_path}")
+    
+    # Check if file exists
+    if not os.path.exists(media_path):
+        error_msg = f"Media file not found on disk: {media_path}"
+        logger.error(error_msg)
+        transcription.status = Transcription.STATUS_FAILED
         transcription.save(update_fields=['status'])
+        return {"status": "error", "message": error_msg}
         
-        # Get the associated media file (audio or video)
-        try:
-            media_file = transcription.media_file
-            logger.info(f"Found media file: {media_file.original_file.name}")
-        except Exception as e:
-            error_msg = f"Error accessing media file for transcription {transcription.id}: {str(e)}"
-            logger.error(error_msg)
-            transcription.status = Transcription.STATUS_FAILED
-            transcription.error_message = error_msg[:200]  # Truncate to fit in the field
-            transcription.save(update_fields=['status', 'error_message'])
-            return {"status": "error", "message": error_msg}
-        
-        # Get the full path to the media file
-        media_path = os.path.join(settings.MEDIA_ROOT, str(media_file.original_file))
-        logger.info(f"Media file path: {media_path}")
+    # Check file extension
+    file_ext = Path(media_path).suffix.lower()
+    original_path = media_path
+    
+    # Check if the file type is supported
+    supported_extensions = AUDIO_EXTENSIONS | VIDEO_EXTENSIONS
+    if file_ext not in supported_extensions:
+        error_msg = f"Unsupported file format: {file_ext}. Supported formats: {', '.join(sorted(supported_extensions))}"
+        logger.error(error_msg)
+        transcription.status = Transcription.STATUS_FAILED
+        transcription.save(update_fields=['status'])
+        return {"status": "error", "message": error_msg}
+    
+    # Load the audio as samples in memory, probing the file once for
+    # both the fast path check and its duration. Decoding runs in the
+    # background while the model is loaded or moved back to the GPU.
+    is_video = media_file.is_video
+    probe = probe_media(media_path)
+    logger.info(f"Loading {file_ext} file")
+    decoding = _DECODE_EXECUTOR.submit(load_audio_samples, media_path, probe)
+    
+    # Only one model load and inference runs at a time in this process
+    _INFERENCE_LOCK.acquire()
+    
+    try:
+        # Peak memory is logged once the task is done
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
         
-        # Check if file exists
-        if not os.path.exists(media_path):
-            error_msg = f"Media file not found on disk: {media_path}"
-            logger.error(error_msg)
-            transcription.status = Transcription.STATUS_FAILED
-            transcription.save(update_fields=['status'])
-            return {"status": "error", "message": error_msg}
-            
-        # Check file extension
-        file_ext = Path(media_path).suffix.lower()
-        original_path = media_path
+        # Get the Whisper model, reusing one already loaded by this worker
+        model_name = transcription.model_used if hasattr(transcription, 'model_used') else 'base'
+        logger.info(f"Loading Whisper model: {model_name}")
+        model = get_whisper_model(model_name, getattr(transcription, 'language', None))
         
-        # Check if the file type is supported
-        if file_ext not in SUPPORTED_EXTENSIONS:
-            error_msg = f"Unsupported file format: {file_ext}. Supported formats: {', '.join(SUPPORTED_EXTENSIONS)}"
+        try:
+            audio = decoding.result()
+        except TRANSIENT_ERRORS:
+            # Retried through autoretry_for by the outer handler
+            raise
+        except Exception as e:
+            error_msg = f"Failed to convert media file: {str(e)}"
             logger.error(error_msg)
             transcription.status = Transcription.STATUS_FAILED
             transcription.save(update_fields=['status'])
             return {"status": "error", "message": error_msg}
         
-        # Convert to WAV if needed
-        is_video = file_ext in VIDEO_EXTENSIONS
-        if file_ext != '.wav':
-            logger.info(f"Converting {file_ext} file to WAV format")
-            try:
-                audio_path = convert_to_wav(media_path, is_video=is_video)
-                temp_files.append(audio_path)  # Track for cleanup
-                original_path = media_path  # Keep track of original file
-            except Exception as e:
-                error_msg = f"Failed to convert media file: {str(e)}"
-                logger.error(error_msg)
-                transcription.status = Transcription.STATUS_FAILED
-                transcription.save(update_fields=['status'])
-                return {"status": "error", "message": error_msg}
-        else:
-            audio_path = media_path
-        
-        log_memory_usage("Before model loading: ")
-        
-        # Load the Whisper model with memory optimizations
-        model_name = transcription.model_used if hasattr(transcription, 'model_used') else 'base'
-        logger.info(f"Loading Whisper model: {model_name}")
-        model = _load_whisper_model(model_name)
-        
-        # Update model in use
-        transcription.model_used = model_name
-        transcription.save(update_fields=['model_used'])
-        
-        # Log memory usage after loading model
-        log_memory_usage("After model loading: ")
-        
         # Check if user's subscription includes speaker diarization
         user = transcription.user
         run_diarization = False
@@ -406,214 +974,271 @@ def process_audio_task(self, transcription_id):
         else:
             logger.warning("User model does not have can_use_speaker_diarization method")
         
-        # If diarization is not available, log a warning
-        if run_diarization and not DIARIZATION_AVAILABLE:
+        # Load the diarizer on first use; if it's not available, log a warning
+        diarizer = get_available_diarizer() if run_diarization and DIARIZATION_AVAILABLE else None
+        if run_diarization and diarizer is None:
             logger.warning("Speaker diarization is not available. Check if pyannote.audio is installed and configured.")
             run_diarization = False
             
+        # Saved together with the results
         transcription.has_speaker_diarization = run_diarization
-        transcription.save(update_fields=['has_speaker_diarization'])
+        
+        # Transcribe the audio file
+        logger.info(f"Starting transcription of {media_path}")
+        start_time = time.time()
         
         try:
-            # Transcribe the audio file
-            logger.info(f"Starting transcription of {audio_path}")
-            start_time = time.time()
+            transcribe_options = transcription_options(transcription)
+            if 'language' in transcribe_options:
+                logger.info(f"Transcribing with language: {transcribe_options['language']}")
+            else:
+                logger.info("Auto-detecting language")
+            
+            # Transcribe the audio
+            model_name = getattr(model, 'name', 'unknown')
+            logger.info(f"Starting transcription with model: {model_name}")
+            result = _transcribe(model, audio, transcribe_options)
+            processing_time = time.time() - start_time
+            logger.info(f"Transcription completed in {processing_time:.2f} seconds")
+            
+            transcription.text = result["text"]
+            # Keep the stored language if the backend couldn't report one
+            transcription.language = result["language"] or transcription.language
+            transcription.duration = result["duration"]
+            segments = result["segments"]
+            transcription.word_count = count_words(segments)
+            completed_fields = [
+                'text', 'language', 'word_count', 'segments', 'has_speaker_diarization',
+                'status', 'processing_time', 'updated_at',
+            ]
             
-            try:
-                # Get language from transcription or auto-detect if not specified
-                language = getattr(transcription, 'language', None)
-                
-                # Prepare transcription options
-                transcribe_options = {
-                    'fp16': False,  # fp16=False for CPU
-                    'task': 'transcribe',
-                    'temperature': 0.2,
-                    'best_of': 3,
-                    'beam_size': 5,
-                    'patience': 1.0,
-                    'length_penalty': 1.0,
-                    'condition_on_previous_text': True,
-                    'word_timestamps': True,
-                    'suppress_tokens': [-1],
-                    'initial_prompt': None
-                }
-                
-                # Only set language if it's specified
-                if language and language != 'auto':
-                    transcribe_options['language'] = language
-                    logger.info(f"Transcribing with language: {language}")
-                else:
-                    logger.info("Auto-detecting language")
-                
-                # Transcribe the audio
-                model_name = getattr(model, 'name', 'unknown')
-                logger.info(f"Starting transcription with model: {model_name}")
-                result = model.transcribe(audio_path, **transcribe_options)
-                processing_time = time.time() - start_time
-                logger.info(f"Transcription completed in {processing_time:.2f} seconds")
-                
-                transcription.text = result["text"]
-                transcription.language = result["language"]
-                transcription.duration = result["duration"]
-                transcription.word_count = len(result["text"].split())
-                
-                # Prepare segments
-                segments = [
-                    {
-                        "start": segment["start"],
-                        "end": segment["end"],
-                        "text": segment["text"].strip(),
-                    }
-                    for segment in result["segments"]
-                ]
-                
-                # Run speaker diarization if enabled
-                if run_diarization and diarizer and diarizer.is_available():
-                    try:
-                        logger.info("Running speaker diarization...")
-                        diarization_result = diarizer.process_audio_file(audio_path)
+            # Run speaker diarization if enabled
+            if run_diarization:
+                try:
+                    logger.info("Running speaker diarization...")
+                    diarization_result = diarizer.process_waveform(audio, SAMPLE_RATE)
+                    
+                    if diarization_result:
+                        # Merge transcription with diarization
+                        merged_segments = merge_transcription_with_diarization(
+                            segments, 
+                            diarization_result.segments
+                        )
                         
-                        if diarization_result:
-                            # Merge transcription with diarization
-                            merged_segments = merge_transcription_with_diarization(
-                                segments, 
-                                diarization_result.segments
-                            )
-                            
-                            # Update segments with speaker information
-                            segments = merged_segments
-                            
-                            # Save speaker information
-                            transcription.speakers = diarization_result.speakers
-                            transcription.speaker_segments = diarization_result.segments
-                            
-                            logger.info(f"Identified {len(diarization_result.speakers)} speakers")
-                        else:
-                            logger.warning("Speaker diarization returned no results")
-                            
-                    except Exception as e:
-                        logger.error(f"Error during speaker diarization: {e}", exc_info=True)
-                        # Continue with transcription even if diarization fails
-                
-                # Save segments to transcription
-                transcription.segments = segments
-                
-                # Update status and save
-                transcription.status = Transcription.STATUS_COMPLETED
-                transcription.processing_time = time.time() - start_time
-                transcription.save()
-                
-                logger.info(f"Successfully processed transcription {transcription.id}")
-                logger.info(f"Processing time: {transcription.processing_time:.2f} seconds")
-                
-                # Update the audio file duration if we have segments
-                if segments:
-                    # Get duration from the last segment's end time
-                    media_file.duration = segments[-1]["end"]
-                else:
-                    # Fallback: Try to get duration using ffprobe
-                    try:
-                        import subprocess
-                        # Ensure path is converted to string for ffprobe
-                        audio_path_str = str(audio_path)
-                        cmd = [
-                            'ffprobe',
-                            '-v', 'error',
-                            '-show_entries', 'format=duration',
-                            '-of', 'default=noprint_wrappers=1:nokey=1',
-                            audio_path_str
-                        ]
-                        duration = float(subprocess.check_output(cmd).decode('utf-8').strip())
-                        media_file.duration = duration
-                    except Exception as e:
-                        logger.warning(f"Could not determine audio duration: {str(e)}")
-                        media_file.duration = 0  # Default to 0 if duration cannot be determined
-                
-                # Only update the duration field, not updated_at
-                media_file.save(update_fields=['duration'])
-                
-                return {
-                    "status": "success",
-                    "transcription_id": str(transcription.id),
-                    "processing_time": processing_time,
-                    "is_video": is_video
-                }
-                
-            except Exception as e:
-                error_msg = f"Error during transcription: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                transcription.status = Transcription.STATUS_FAILED
-                transcription.save(update_fields=['status'])
-                # Re-raise the exception to trigger retry
-                raise self.retry(exc=e, countdown=60)
-                
-        except Exception as e:
-            # Import here to avoid circular imports
-            from django.db import transaction
-            from django.core.exceptions import ObjectDoesNotExist
+                        # Update segments with speaker information
+                        segments = merged_segments
+                        
+                        # Save speaker information
+                        transcription.speakers = diarization_result.speakers
+                        transcription.speaker_segments = diarization_result.segments
+                        completed_fields += ['speakers', 'speaker_segments']
+                        
+                        logger.info(f"Identified {len(diarization_result.speakers)} speakers")
+                    else:
+                        logger.warning("Speaker diarization returned no results")
+                        
+                except Exception as e:
+                    logger.error(f"Error during speaker diarization: {e}", exc_info=True)
+                    # Continue with transcription even if diarization fails
             
-            # Handle the case where the transcription doesn't exist
-            if isinstance(e, ObjectDoesNotExist) or "does not exist" in str(e).lower():
-                logger.error(f"Transcription with id {transcription_id} does not exist")
-                return {"status": "error", "message": f"Transcription with id {transcription_id} does not exist"}
+            # Save segments to transcription
+            transcription.segments = segments
             
-            # Log the full error for debugging
-            error_message = str(e)[:500]  # Limit error message length
-            logger.error(f"Error in process_audio_task for transcription {transcription_id}: {error_message}", exc_info=True)
+            # Update status and write all results in a single UPDATE
+            transcription.status = Transcription.STATUS_COMPLETED
+            transcription.processing_time = time.time() - start_time
+            transcription.save(update_fields=completed_fields)
             
-            # Update status to failed if we can, using transaction for safety
-            try:
-                from .models import Transcription
-                with transaction.atomic():
-                    try:
-                        transcription = Transcription.objects.get(id=transcription_id)
-                        transcription.status = 'failed'  # Use string literal to avoid dependency
-                        transcription.text = f"Unexpected error: {error_message}"
-                        transcription.save(update_fields=['status', 'text'])
-                    except Exception as save_error:
-                        logger.error(f"Failed to update transcription status: {str(save_error)}")
-                        # If we can't update the status, we should still handle the retry logic
-            except ImportError as ie:
-                logger.error(f"Failed to import Transcription model: {str(ie)}")
+            logger.info(f"Successfully processed transcription {transcription.id}")
+            logger.info(f"Processing time: {transcription.processing_time:.2f} seconds")
+            log_memory_usage("After transcription: ")
             
-            # Retry the task with exponential backoff, but not for certain errors
-            if isinstance(e, (ValueError, TypeError, AttributeError, ImportError)):
-                # Don't retry for programming errors
-                logger.error(f"Not retrying due to programming error: {str(e)}")
-                raise
-                
-            countdown = 60 * (2 ** (self.request.retries - 1))  # 1st retry: 60s, 2nd: 120s, 3rd: 240s
-            max_retry_delay = min(countdown, 300)  # Max 5 minutes delay
-            logger.warning(f"Retrying task in {max_retry_delay} seconds (attempt {self.request.retries + 1})")
-            raise self.retry(exc=e, countdown=max_retry_delay)                 
+            # The decoded sample count gives the exact duration, even
+            # when trailing silence has no segments
+            media_file.duration = len(audio) / SAMPLE_RATE
             
-        finally:
-            # Clean up temporary files
-            for temp_file in temp_files:
-                try:
-                    if os.path.exists(temp_file):
-                        if os.path.isdir(temp_file):
-                            shutil.rmtree(temp_file)
-                        else:
-                            os.remove(temp_file)
-                        logger.info(f"Cleaned up temporary file: {temp_file}")
-                except Exception as e:
-                    logger.warning(f"Could not clean up temporary file {temp_file}: {str(e)}")
+            # Only update the duration field, not updated_at
+            media_file.save(update_fields=['duration'])
+            
+            return {
+                "status": "success",
+                "transcription_id": str(transcription.id),
+                "processing_time": processing_time,
+                "is_video": is_video
+            }
+            
+        except Exception as e:
+            error_msg = f"Error during transcription: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            transcription.status = Transcription.STATUS_FAILED
+            transcription.save(update_fields=['status'])
+            # The outer handler decides whether to retry
+            raise
             
-            # Clean up temporary WAV file if created
-            if os.path.exists(audio_path) and audio_path != media_path:
+    except Exception as e:
+        # Import here to avoid circular imports
+        from django.db import transaction
+        
+        # Handle the case where the transcription doesn't exist
+        if isinstance(e, ObjectDoesNotExist) or "does not exist" in str(e).lower():
+            logger.error(f"Transcription with id {transcription_id} does not exist")
+            return {"status": "error", "message": f"Transcription with id {transcription_id} does not exist"}
+        
+        # Log the full error for debugging
+        error_message = str(e)[:500]  # Limit error message length
+        logger.error(f"Error in process_audio_task for transcription {transcription_id}: {error_message}", exc_info=True)
+        
+        # Update status to failed if we can, using transaction for safety
+        try:
+            from .models import Transcription
+            with transaction.atomic():
                 try:
-                    os.remove(audio_path)
-                    logger.info(f"Cleaned up temporary file: {audio_path}")
-                except Exception as e:
-                    logger.warning(f"Error cleaning up temporary file {audio_path}: {e}")
+                    transcription = Transcription.objects.get(id=transcription_id)
+                    transcription.status = 'failed'  # Use string literal to avoid dependency
+                    transcription.text = f"Unexpected error: {error_message}"
+                    transcription.save(update_fields=['status', 'text'])
+                except Exception as save_error:
+                    logger.error(f"Failed to update transcription status: {str(save_error)}")
+                    # If we can't update the status, we should still handle the retry logic
+        except ImportError as ie:
+            logger.error(f"Failed to import Transcription model: {str(ie)}")
+        
+        # autoretry_for retries TRANSIENT_ERRORS with backoff; anything
+        # else fails the task
+        raise
+        
+    finally:
+        # The model stays in _MODEL_CACHE for the next task
+        _INFERENCE_LOCK.release()
+
+
+@shared_task(
+    bind=True,
+    name='audio.tasks.batch_process_audio_task',
+    soft_time_limit=1800,  # 30 minute soft time limit
+    time_limit=2100,  # 35 minute hard time limit
+    acks_late=True,  # Don't ack until task is complete
+    reject_on_worker_lost=True  # Require the worker to acknowledge task loss
+)
+def batch_process_audio_task(self):
+    """
+    Celery task that claims pending transcriptions and transcribes the short
+    ones together, handing longer ones to process_audio_task
+    """
+    from django.db import transaction
+    from .models import Transcription
+    
+    # Claim a batch; rows locked by another worker's claim are skipped
+    with transaction.atomic():
+        claimed = list(
+            Transcription.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status=Transcription.STATUS_PENDING)
+            .exclude(media_file__is_video=True, media_file__audio_extracted=False)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:settings.WHISPER_BATCH_SIZE]
+        )
+        Transcription.objects.filter(pk__in=claimed).update(status=Transcription.STATUS_PROCESSING)
+    if not claimed:
+        return
+    
+    # Claimed rows that were completed, failed or handed to process_audio_task;
+    # anything else is put back to pending on the way out
+    settled = set()
+    try:
+        _process_claimed_batch(claimed, settled)
+    finally:
+        unsettled = [pk for pk in claimed if pk not in settled]
+        if unsettled:
+            logger.warning(f"Returning {len(unsettled)} unprocessed transcriptions to pending")
+            Transcription.objects.filter(
+                pk__in=unsettled, status=Transcription.STATUS_PROCESSING
+            ).update(status=Transcription.STATUS_PENDING)
+
+
+def _process_claimed_batch(claimed, settled):
+    """Transcribe or delegate claimed transcriptions, adding each one handled to settled"""
+    from .models import Transcription, probe_media
+    
+    def mark_failed(pks, error):
+        # Same convention as process_audio_task: the error goes in the text
+        Transcription.objects.filter(pk__in=pks).update(
+            status=Transcription.STATUS_FAILED, text=f"Unexpected error: {str(error)[:500]}"
+        )
+        settled.update(pks)
+    
+    # Group the short clips by the model and language they are decoded with
+    batches = {}
+    rows = (
+        Transcription.objects.select_related('media_file', 'user')
+        .defer('text', *Transcription.PAYLOAD_FIELDS)
+        .filter(pk__in=claimed)
+    )
+    for transcription in rows:
+        audio = None
+        try:
+            media_path = media_audio_path(transcription.media_file)
+            probe = probe_media(media_path)
+            duration = float(probe['format'].get('duration') or 0)
             
-            # Explicitly clean up model and free memory
-            if 'model' in locals():
-                del model
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-                    torch.cuda.synchronize()
-                gc.collect()
-                log_memory_usage("After cleanup: ")
+            # Long clips, speaker diarization and word timestamps need the
+            # full per-file pipeline
+            user = transcription.user
+            wants_diarization = DIARIZATION_AVAILABLE and getattr(user, 'can_use_speaker_diarization', lambda: False)()
+            if (duration and duration <= BATCH_MAX_SECONDS and not wants_diarization
+                    and not transcription.need_word_timestamps):
+                audio = load_audio_samples(media_path, probe)
+        except TRANSIENT_ERRORS as e:
+            # Left unsettled, so it goes back to pending and is retried later
+            # like process_audio_task retries it
+            logger.warning(f"Transient error loading audio for transcription {transcription.id}: {e}")
+            continue
+        except Exception as e:
+            logger.error(f"Failed to load audio for transcription {transcription.id}: {e}")
+            mark_failed([transcription.pk], e)
+            continue
         
+        if audio is None:
+            # If this can't be queued the row goes back to pending
+            process_audio_task.delay(str(transcription.id))
+            settled.add(transcription.pk)
+            continue
+        
+        # Clips are only batched with others that decode the same way
+        options = transcription_options(transcription)
+        key = (transcription.model_used, options.get('language'), transcription.beam_size, transcription.best_of)
+        batches.setdefault(key, []).append((transcription, audio))
+    
+    for (model_name, language, _, _), items in batches.items():
+        start_time = time.time()
+        try:
+            with _INFERENCE_LOCK:
+                model = get_whisper_model(model_name, language)
+                options = transcription_options(items[0][0])
+                results = _transcribe_batch(model, [audio for _, audio in items], options)
+        except TRANSIENT_ERRORS as e:
+            logger.warning(f"Transient error in batched transcription with {model_name}: {e}")
+            continue
+        except Exception as e:
+            logger.error(f"Batched transcription with {model_name} failed: {e}", exc_info=True)
+            mark_failed([t.pk for t, _ in items], e)
+            continue
+        
+        processing_time = time.time() - start_time
+        logger.info(f"Transcribed {len(items)} clips with {model_name} in {processing_time:.2f} seconds")
+        for (transcription, _), result in zip(items, results):
+            transcription.text = result["text"]
+            transcription.language = result["language"] or transcription.language
+            transcription.word_count = count_words(result["segments"])
+            transcription.segments = result["segments"]
+            transcription.has_speaker_diarization = False
+            transcription.status = Transcription.STATUS_COMPLETED
+            transcription.processing_time = processing_time
+            transcription.save(update_fields=[
+                'text', 'language', 'word_count', 'segments', 'has_speaker_diarization',
+                'status', 'processing_time', 'updated_at',
+            ])
+            settled.add(transcription.pk)
+            
+            media_file = transcription.media_file
+            media_file.duration = result["duration"]
+            media_file.save(update_fields=['duration'])
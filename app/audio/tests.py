@@ -1,3 +1,258 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from .diarization import merge_transcription_with_diarization
+from .models import MediaFile, Transcription
+from .tasks import batch_process_audio_task
+
+
+def _probe(duration):
+    return {'format': {'duration': str(duration)}, 'audio': {}, 'video': {}}
+
+
+def _results(model, audios, options):
+    return [
+        {
+            'text': f'clip {i}',
+            'language': 'en',
+            'segments': [{'start': 0.0, 'end': 1.0, 'text': f'clip {i}'}],
+            'duration': 1.0,
+        }
+        for i in range(len(audios))
+    ]
+
+
+@override_settings(WHISPER_BATCH_SIZE=8)
+class BatchProcessAudioTaskTests(TestCase):
+    """Status transitions of the rows claimed by batch_process_audio_task"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='batch', password='batch')
+
+    def setUp(self):
+        patches = {
+            'probe': mock.patch('audio.models.probe_media', return_value=_probe(5)),
+            'load': mock.patch('audio.tasks.load_audio_samples', return_value=np.zeros(16000, np.float32)),
+            'model': mock.patch('audio.tasks.get_whisper_model', return_value=object()),
+            'transcribe': mock.patch('audio.tasks._transcribe_batch', side_effect=_results),
+            'delay': mock.patch('audio.tasks.process_audio_task.delay'),
+            'diarization': mock.patch('audio.tasks.DIARIZATION_AVAILABLE', False),
+        }
+        self.mocks = {name: patch.start() for name, patch in patches.items()}
+        for patch in patches.values():
+            self.addCleanup(patch.stop)
+
+    def create_transcription(self, filename='clip.wav', **kwargs):
+        transcription = Transcription.objects.create(user=self.user, **kwargs)
+        MediaFile.objects.create(transcription=transcription, original_file=f'user_{self.user.pk}/audio/{filename}')
+        return transcription
+
+    def assertStatus(self, transcription, status):
+        transcription.refresh_from_db()
+        self.assertEqual(transcription.status, status)
+
+    def test_short_clips_are_completed(self):
+        first, second = self.create_transcription(), self.create_transcription()
+
+        batch_process_audio_task()
+
+        self.mocks['transcribe'].assert_called_once()
+        for transcription in (first, second):
+            self.assertStatus(transcription, Transcription.STATUS_COMPLETED)
+            self.assertTrue(transcription.text.startswith('clip'))
+            self.assertEqual(transcription.media_file.duration, 1.0)
+
+    def test_long_clips_are_delegated(self):
+        self.mocks['probe'].return_value = _probe(600)
+        transcription = self.create_transcription()
+
+        batch_process_audio_task()
+
+        self.mocks['delay'].assert_called_once_with(str(transcription.id))
+        self.mocks['transcribe'].assert_not_called()
+        # process_audio_task owns the row from here
+        self.assertStatus(transcription, Transcription.STATUS_PROCESSING)
+
+    def test_word_timestamps_are_delegated(self):
+        transcription = self.create_transcription(need_word_timestamps=True)
+
+        batch_process_audio_task()
+
+        self.mocks['delay'].assert_called_once_with(str(transcription.id))
+        self.assertStatus(transcription, Transcription.STATUS_PROCESSING)
+
+    def test_load_failure_only_fails_that_row(self):
+        broken = self.create_transcription(filename='broken.wav')
+        working = self.create_transcription()
+
+        def load(path, probe):
+            if path.endswith('broken.wav'):
+                raise RuntimeError('bad audio')
+            return np.zeros(16000, np.float32)
+        self.mocks['load'].side_effect = load
+
+        batch_process_audio_task()
+
+        self.assertStatus(broken, Transcription.STATUS_FAILED)
+        self.assertIn('bad audio', broken.text)
+        self.assertStatus(working, Transcription.STATUS_COMPLETED)
+
+    def test_transient_load_error_returns_row_to_pending(self):
+        transcription = self.create_transcription()
+        self.mocks['load'].side_effect = OSError('storage unavailable')
+
+        batch_process_audio_task()
+
+        self.assertStatus(transcription, Transcription.STATUS_PENDING)
+
+    def test_batch_failure_fails_its_rows(self):
+        first, second = self.create_transcription(), self.create_transcription()
+        self.mocks['transcribe'].side_effect = RuntimeError('out of memory')
+
+        batch_process_audio_task()
+
+        for transcription in (first, second):
+            self.assertStatus(transcription, Transcription.STATUS_FAILED)
+            self.assertIn('out of memory', transcription.text)
+
+    def test_unexpected_error_returns_rows_to_pending(self):
+        transcription = self.create_transcription()
+
+        with mock.patch('audio.tasks.transcription_options', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                batch_process_audio_task()
+
+        self.assertStatus(transcription, Transcription.STATUS_PENDING)
+
+    def test_videos_without_extracted_audio_are_not_claimed(self):
+        transcription = self.create_transcription(filename='clip.mp4')
+
+        batch_process_audio_task()
+
+        self.mocks['probe'].assert_not_called()
+        self.assertStatus(transcription, Transcription.STATUS_PENDING)
+
+
+def _reference_merge(transcription_segments, diarization_segments):
+    """The per-segment loop merge_transcription_with_diarization replaced"""
+    if not diarization_segments:
+        return transcription_segments
+    diarization_segments = sorted(diarization_segments, key=lambda x: x['start'])
+    result = []
+    for seg in transcription_segments:
+        seg_start, seg_end = seg.get('start', 0), seg.get('end', float('inf'))
+        overlapping_speakers = {}
+        for diar_seg in diarization_segments:
+            if diar_seg['start'] < seg_end and diar_seg['end'] > seg_start:
+                overlap = max(0, min(seg_end, diar_seg['end']) - max(seg_start, diar_seg['start']))
+                speaker = diar_seg['speaker']
+                overlapping_speakers[speaker] = overlapping_speakers.get(speaker, 0) + overlap
+        new_seg = seg.copy()
+        if overlapping_speakers:
+            new_seg['speaker'] = max(overlapping_speakers.items(), key=lambda x: x[1])[0]
+        result.append(new_seg)
+    return result
+
+
+class MergeTranscriptionWithDiarizationTests(TestCase):
+    """merge_transcription_with_diarization must agree with the loop it replaced"""
+
+    def assertMatchesReference(self, segments, turns):
+        self.assertEqual(
+            merge_transcription_with_diarization(segments, turns),
+            _reference_merge(segments, turns),
+        )
+
+    def test_speaker_with_most_overlap_wins(self):
+        turns = [
+            {'start': 0.0, 'end': 2.0, 'speaker': 'A'},
+            {'start': 2.0, 'end': 5.0, 'speaker': 'B'},
+        ]
+        segments = [{'start': 1.0, 'end': 4.0, 'text': 'hello'}]
+        merged = merge_transcription_with_diarization(segments, turns)
+        self.assertEqual(merged[0]['speaker'], 'B')
+        self.assertMatchesReference(segments, turns)
+
+    def test_overlap_sums_over_a_speakers_turns(self):
+        turns = [
+            {'start': 0.0, 'end': 1.0, 'speaker': 'A'},
+            {'start': 1.0, 'end': 2.5, 'speaker': 'B'},
+            {'start': 2.5, 'end': 3.5, 'speaker': 'A'},
+        ]
+        segments = [{'start': 0.0, 'end': 3.5, 'text': 'hello'}]
+        self.assertEqual(merge_transcription_with_diarization(segments, turns)[0]['speaker'], 'A')
+        self.assertMatchesReference(segments, turns)
+
+    def test_ties_go_to_the_earlier_turn(self):
+        # Unsorted input: B's turn starts first once sorted
+        turns = [
+            {'start': 1.0, 'end': 3.0, 'speaker': 'A'},
+            {'start': 0.0, 'end': 2.0, 'speaker': 'B'},
+        ]
+        segments = [{'start': 1.0, 'end': 2.0, 'text': 'both'}]
+        self.assertEqual(merge_transcription_with_diarization(segments, turns)[0]['speaker'], 'B')
+        self.assertMatchesReference(segments, turns)
+
+    def test_zero_length_segment_gets_the_turn_containing_it(self):
+        turns = [
+            {'start': 0.0, 'end': 2.0, 'speaker': 'A'},
+            {'start': 1.0, 'end': 3.0, 'speaker': 'B'},
+        ]
+        segments = [{'start': 2.5, 'end': 2.5, 'text': ''}, {'start': 1.5, 'end': 1.5, 'text': ''}]
+        merged = merge_transcription_with_diarization(segments, turns)
+        self.assertEqual([seg['speaker'] for seg in merged], ['B', 'A'])
+        self.assertMatchesReference(segments, turns)
+
+    def test_segments_without_overlap_get_no_speaker(self):
+        turns = [{'start': 0.0, 'end': 1.0, 'speaker': 'A'}]
+        segments = [{'start': 1.0, 'end': 2.0, 'text': 'after'}, {'start': 5.0, 'text': 'open ended'}]
+        merged = merge_transcription_with_diarization(segments, turns)
+        self.assertNotIn('speaker', merged[0])
+        self.assertNotIn('speaker', merged[1])
+        self.assertMatchesReference(segments, turns)
+
+    def test_overlapping_turns_of_one_speaker(self):
+        # A's short turn lies inside its long one, so A is still speaking at 3-4
+        turns = [
+            {'start': 0.0, 'end': 4.0, 'speaker': 'A'},
+            {'start': 1.0, 'end': 2.0, 'speaker': 'A'},
+            {'start': 0.0, 'end': 3.0, 'speaker': 'B'},
+            {'start': 2.5, 'end': 5.0, 'speaker': 'B'},
+        ]
+        segments = [{'start': 3.0, 'end': 4.0, 'text': 'tie'}, {'start': 0.5, 'end': 2.5, 'text': 'both'}]
+        merged = merge_transcription_with_diarization(segments, turns)
+        self.assertEqual([seg['speaker'] for seg in merged], ['A', 'A'])
+        self.assertMatchesReference(segments, turns)
+
+    def test_empty_inputs_are_returned_unchanged(self):
+        segments = [{'start': 0.0, 'end': 1.0, 'text': 'hello'}]
+        self.assertIs(merge_transcription_with_diarization(segments, []), segments)
+        self.assertEqual(merge_transcription_with_diarization([], [{'start': 0.0, 'end': 1.0, 'speaker': 'A'}]), [])
+
+    def test_random_conversations_match_reference(self):
+        # Quarter-second times keep every sum exact, so ties are real ties
+        rng = np.random.default_rng(0)
+        for i in range(400):
+            turns = []
+            for speaker in ('A', 'B', 'C')[:rng.integers(1, 4)]:
+                count = rng.integers(1, 6)
+                if i % 2:
+                    # Turns of one speaker may overlap each other
+                    starts = rng.integers(0, 120, count) / 4
+                    bounds = np.stack([starts, starts + rng.integers(1, 40, count) / 4], axis=1)
+                else:
+                    bounds = np.sort(rng.choice(np.arange(0, 120) / 4, size=2 * count, replace=False)).reshape(-1, 2)
+                turns += [
+                    {'start': float(start), 'end': float(end), 'speaker': speaker}
+                    for start, end in bounds
+                ]
+            rng.shuffle(turns)
+            segments = []
+            for _ in range(rng.integers(1, 15)):
+                start = rng.integers(0, 120) / 4
+                segments.append({'start': float(start), 'end': float(start + rng.integers(0, 20) / 4), 'text': 'x'})
+            self.assertMatchesReference(segments, turns)
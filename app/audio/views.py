@@ -16,9 +16,9 @@ from django.core.files import File
 from django.utils import timezone
 from subscriptions.models import UserSubscription, SubscriptionPlan
 
-from .models import Transcription, MediaFile
+from .models import Transcription, MediaFile, MEDIA_KINDS
 from .forms import AudioUploadForm
-from .diarization import SpeakerDiarizer, DIARIZATION_AVAILABLE
+from .diarization import get_available_diarizer, DIARIZATION_AVAILABLE
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -26,30 +26,12 @@ from rest_framework import status
 
 logger = logging.getLogger(__name__)
 
-# Initialize diarizer
-diarizer = None
-if DIARIZATION_AVAILABLE:
-    try:
-        diarizer = SpeakerDiarizer()
-        if not diarizer.is_available():
-            logger.warning("Speaker diarization is not available")
-    except Exception as e:
-        logger.error(f"Failed to initialize speaker diarizer: {e}")
-
 def get_file_type(file_name):
     """
     Determine if the file is a video or audio based on its extension
     Returns: 'video', 'audio', or None if not supported
     """
-    video_extensions = {'.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v', '.3gp'}
-    audio_extensions = {'.mp3', '.wav', '.m4a', '.ogg', '.flac', '.aac', '.wma', '.aiff'}
-    
-    ext = Path(file_name).suffix.lower()
-    if ext in video_extensions:
-        return 'video'
-    elif ext in audio_extensions:
-        return 'audio'
-    return None
+    return MEDIA_KINDS.get(Path(file_name).suffix.lower())
 
 @login_required
 def upload_audio(request):
@@ -120,13 +102,14 @@ def upload_audio(request):
                     )
                     media_file.save()
                     
-                    # If it's a video, extract audio asynchronously
+                    # If it's a video, extract audio asynchronously; the
+                    # extraction task starts processing once it's done
                     if media_file.is_video:
                         from .tasks import extract_audio_task
                         extract_audio_task.delay(media_file.id)
-                    
-                    # Start audio processing
-                    transcription.process_audio()
+                    else:
+                        # Start audio processing
+                        transcription.process_audio()
                     
                     messages.success(request, 'Your file has been uploaded and is being processed.')
                     return redirect('audio:audio_detail', pk=transcription.pk)
@@ -167,7 +150,12 @@ def upload_audio(request):
 @login_required
 def audio_list(request):
     """Display list of user's transcriptions"""
-    transcriptions = Transcription.objects.filter(user=request.user).select_related('media_file').order_by('-created_at')
+    transcriptions = (
+        Transcription.objects.filter(user=request.user)
+        .select_related('media_file')
+        .defer(*Transcription.PAYLOAD_FIELDS)
+        .order_by('-created_at')
+    )
     
     # Get subscription status
     has_active_subscription = False
@@ -292,8 +280,9 @@ def process_speaker_diarization(request, transcription_id):
     This endpoint is protected and only available to authenticated users with
     an active subscription that includes speaker diarization.
     """
-    # Check if diarization is available
-    if not DIARIZATION_AVAILABLE or diarizer is None:
+    # Check if diarization is available; the pipeline loads on first use
+    diarizer = get_available_diarizer() if DIARIZATION_AVAILABLE else None
+    if diarizer is None:
         return Response(
             {"error": "Speaker diarization is not available on this server"},
             status=status.HTTP_503_SERVICE_UNAVAILABLE
@@ -0,0 +1,14 @@
+"""
+Gunicorn configuration, picked up automatically from the working directory.
+"""
+
+# The app is not preloaded in the master: torch/CUDA state is not fork-safe.
+
+
+def post_worker_init(worker):
+    """Import the audio views and tasks once the worker has loaded Django.
+
+    These pull in torch and the diarization model, which would otherwise be
+    loaded during the first request each worker serves.
+    """
+    from audio import views, tasks  # noqa